@@ -0,0 +1,328 @@
+"""Benchmark reproducible de los algoritmos de búsqueda y de los backends de render.
+
+Búsqueda: todos los pares ordenados de capitales (32×31) y una muestra fija
+de pares sobre un grafo sintético. Por algoritmo se registra la
+distribución de latencias, los nodos expandidos y la brecha de optimalidad
+frente a Dijkstra (la voraz no garantiza el camino mínimo).
+
+Render: el renderizador PIL siempre; el backend Selenium solo si hay
+pantalla y Chrome (si no, queda registrado como omitido).
+
+Las mediciones se repiten en rondas completas y cada par (o ruta
+renderizada) cuenta su mejor tiempo, de modo que un momento lento del
+sistema no se lee como regresión. En cada ronda se cronometra además una
+carga fija en Python puro que no depende del código medido; al comparar, la
+línea base se escala por la razón entre esas referencias, porque una
+máquina compartida puede pasar minutos enteros más lenta. Los resultados se
+escriben en JSON y se comparan contra una línea base con umbrales
+configurables; el código de salida es 1 si hay regresiones y 2 si falta la
+línea base.
+
+La línea base depende de la máquina y no se versiona: cada desarrollador la
+registra una vez con ``--guardar-base`` sobre un árbol sin cambios.
+
+Uso: ``python benchmark.py [--sintetico 10000] [--pares 200] [--render 10] [--sin-selenium]
+[--repeticiones 3] [--salida benchmark_resultados.json] [--linea-base benchmark_base.json] [--guardar-base]``
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from motor_rutas import MotorRutas
+
+ALGORITMOS = ('voraz', 'a_estrella', 'dijkstra', 'bidireccional', 'alt', 'alt_bidireccional', 'jerarquia', 'tabla')
+
+def _entorno():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'plataforma': platform.platform(),
+            'procesador': platform.processor() or platform.machine(), 'commit': commit,
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def _latencias(muestras_ms):
+    arreglo = np.asarray(muestras_ms, dtype=np.float64)
+    return {'media_ms': round(float(arreglo.mean()), 4),
+            **{f'p{q}_ms': round(float(np.percentile(arreglo, q)), 4) for q in (50, 90, 99)},
+            'max_ms': round(float(arreglo.max()), 4)}
+
+def _preparar(motor, algoritmos):
+    """Carga los preprocesamientos que piden los algoritmos; devuelve sus tiempos en s"""
+    tiempos = {}
+    for algoritmo, cargar in (('alt', motor.cargar_hitos), ('alt_bidireccional', motor.cargar_hitos),
+                              ('jerarquia', motor.cargar_jerarquia), ('tabla', motor.cargar_tabla)):
+        if algoritmo in algoritmos and algoritmo not in motor.algoritmos:
+            inicio = time.perf_counter()
+            cargar()
+            tiempos[cargar.__name__] = round(time.perf_counter() - inicio, 3)
+    return tiempos
+
+def _cronometrar(funcion, *args):
+    """``(ms, resultado)`` de una llamada"""
+    t0 = time.perf_counter()
+    resultado = funcion(*args)
+    return (time.perf_counter() - t0) * 1000, resultado
+
+def _carga_referencia():
+    """Montículo y diccionario sobre datos fijos: mide la velocidad de la máquina, no la del código"""
+    rng = random.Random(0)
+    monticulo = [(rng.random(), i) for i in range(20000)]
+    heapq.heapify(monticulo)
+    vistos = {}
+    while monticulo:
+        distancia, i = heapq.heappop(monticulo)
+        vistos[i] = distancia
+
+def medir_busqueda(motor, pares, algoritmos, repeticiones=3):
+    """Estadísticas por algoritmo sobre ``pares`` (ids); la referencia óptima es Dijkstra.
+
+    Las repeticiones son rondas completas sobre todos los algoritmos: la
+    latencia de cada par es la mejor de sus rondas, que quedan repartidas a lo
+    largo de toda la medición y no caen juntas en un momento lento.
+    """
+    optimos = {}
+    for inicio, meta in pares:
+        resultado = motor.algoritmos['dijkstra'](inicio, meta)
+        optimos[inicio, meta] = math.inf if resultado is None else resultado[1]
+
+    estadisticas = {'preparacion_s': _preparar(motor, algoritmos)}
+    referencia = math.inf
+    mejores = {algoritmo: [math.inf] * len(pares) for algoritmo in algoritmos}
+    resultados = {algoritmo: [None] * len(pares) for algoritmo in algoritmos}
+    for _ in range(max(1, repeticiones)):
+        for algoritmo in algoritmos:
+            referencia = min(referencia, _cronometrar(_carga_referencia)[0])
+            buscar = motor.algoritmos[algoritmo]
+            for k, (inicio, meta) in enumerate(pares):
+                ms, resultados[algoritmo][k] = _cronometrar(buscar, inicio, meta)
+                mejores[algoritmo][k] = min(mejores[algoritmo][k], ms)
+    estadisticas['referencia_ms'] = round(referencia, 4)
+
+    for algoritmo in algoritmos:
+        expandidos, empujes, brechas = [], [], []
+        fallidas = 0
+        for (inicio, meta), resultado in zip(pares, resultados[algoritmo]):
+            optimo = optimos[inicio, meta]
+            if resultado is None:
+                fallidas += math.isfinite(optimo)
+                continue
+            _, distancia, n_expandidos, n_empujes = resultado
+            expandidos.append(n_expandidos)
+            empujes.append(n_empujes)
+            if optimo > 0:
+                brechas.append((distancia - optimo) / optimo * 100)
+        brechas = np.asarray(brechas or [0.0])
+        estadisticas[algoritmo] = {
+            **_latencias(mejores[algoritmo]),
+            'expandidos_medio': round(float(np.mean(expandidos)), 2) if expandidos else 0.0,
+            'empujes_medio': round(float(np.mean(empujes)), 2) if empujes else 0.0,
+            'brecha_media_pct': round(float(brechas.mean()), 4) + 0.0,
+            'brecha_max_pct': round(float(brechas.max()), 4),
+            'no_optimas': int((brechas > 1e-9).sum()),
+            'fallidas': fallidas,
+        }
+    return estadisticas
+
+def medir_render_raster(motor, rutas, repeticiones=3):
+    from render_raster import RenderizadorRaster
+
+    renderizador = RenderizadorRaster(motor.datos, ubicaciones=motor.ubicaciones)
+    inicio = time.perf_counter()
+    renderizador.render_base()
+    frio = (time.perf_counter() - inicio) * 1000
+    # Igual que en la búsqueda: rondas completas y el mejor tiempo de cada ruta
+    mejores = [math.inf] * len(rutas)
+    referencia = math.inf
+    for _ in range(max(1, repeticiones)):
+        for k, ruta in enumerate(rutas):
+            referencia = min(referencia, _cronometrar(_carga_referencia)[0])
+            mejores[k] = min(mejores[k], _cronometrar(renderizador.render_ruta, ruta)[0])
+    return {'base_ms': round(frio, 3), **_latencias(mejores), 'referencia_ms': round(referencia, 4)}
+
+def medir_render_selenium(motor, rutas):
+    """Renders por el mismo camino que la interfaz (``MapaInteractivo`` y su trabajador)"""
+    try:
+        import tkinter as tk
+        from ciudades import MapaInteractivo
+
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as error:
+        return {'omitido': f"sin pantalla para Tk: {error}"}
+    try:
+        mapa = MapaInteractivo(root, motor.datos, backend='selenium', ubicaciones=motor.ubicaciones)
+
+        def en_trabajador(ruta):
+            # La solicitud reemplaza al mapa base pendiente; si ya empezó, espera a que termine
+            listo = []
+            def medir():
+                inicio = time.perf_counter()
+                mapa.renderizar_ruta(ruta)
+                return (time.perf_counter() - inicio) * 1000
+            mapa.trabajador.solicitar(medir, al_terminar=listo.append, al_fallar=listo.append)
+            while not listo:
+                root.update()
+                time.sleep(0.005)
+            if isinstance(listo[0], Exception):
+                raise listo[0]
+            return listo[0]
+
+        try:
+            primera = en_trabajador(rutas[0])
+        except Exception as error:
+            return {'omitido': f"Chrome no disponible: {error}"}
+        muestras = [en_trabajador(ruta) for ruta in rutas[1:] or rutas]
+        return {'primera_ms': round(primera, 3), **_latencias(muestras)}
+    finally:
+        driver = getattr(mapa, 'driver', None) if 'mapa' in locals() else None
+        if driver is not None:
+            driver.quit()
+        root.destroy()
+
+def ejecutar(args):
+    resultados = {'entorno': _entorno(), 'busqueda': {}, 'render': {}}
+
+    motor = MotorRutas(args.json)
+    ids = [motor.id_ciudad(nombre) for nombre in motor.capitales]
+    pares = [(i, j) for i in ids for j in ids if i != j]
+    print(f"Capitales: {len(pares)} pares", file=sys.stderr)
+    resultados['busqueda']['capitales'] = medir_busqueda(motor, pares, ALGORITMOS, args.repeticiones)
+
+    if args.sintetico:
+        from grafo_sintetico import generar_grafo
+
+        sintetico = generar_grafo(args.sintetico, semilla=0)
+        rng = np.random.default_rng(0)
+        muestra = [tuple(map(int, par)) for par in rng.integers(sintetico.grafo.n, size=(args.pares, 2))]
+        # Floyd–Warshall es O(n³): la tabla solo se mide sobre las capitales
+        algoritmos = tuple(a for a in ALGORITMOS if a != 'tabla')
+        print(f"Sintético: {sintetico.grafo.n} nodos, {len(muestra)} pares", file=sys.stderr)
+        resultados['busqueda'][f'sintetico_{args.sintetico}'] = medir_busqueda(
+            sintetico, muestra, algoritmos, args.repeticiones)
+
+    if args.render:
+        rng = np.random.default_rng(1)
+        rutas = []
+        for k in rng.permutation(len(pares)):
+            resultado = motor.ruta(motor.grafo.nombres[pares[k][0]], motor.grafo.nombres[pares[k][1]])
+            if resultado is not None:
+                rutas.append(resultado.ruta)
+            if len(rutas) == args.render:
+                break
+        resultados['render']['raster'] = medir_render_raster(motor, rutas, args.repeticiones)
+        if args.sin_selenium:
+            resultados['render']['selenium'] = {'omitido': "--sin-selenium"}
+        else:
+            resultados['render']['selenium'] = medir_render_selenium(motor, rutas)
+    return resultados
+
+def comparar(actual, base, umbral_latencia, umbral_expandidos, umbral_brecha, piso_ms=0.05):
+    """Regresiones de ``actual`` frente a ``base``: latencia y expansiones relativas, brecha en puntos.
+
+    Las latencias de la línea base se escalan por la razón entre las cargas de
+    referencia (la máquina ahora frente a la de entonces). Una latencia solo
+    cuenta como regresión si además sube más de ``piso_ms``: en consultas de
+    microsegundos el ruido supera cualquier umbral relativo.
+    """
+    regresiones = []
+
+    def escala(previos, datos):
+        if previos.get('referencia_ms') and datos.get('referencia_ms'):
+            return datos['referencia_ms'] / previos['referencia_ms']
+        return 1.0
+
+    def revisar(ruta, antes, despues, umbral, relativo, piso=0.0, factor=1.0):
+        if antes is None or despues is None:
+            return
+        esperado = antes * factor
+        limite = max(esperado * (1 + umbral), esperado + piso) if relativo else antes + umbral
+        if despues > limite + 1e-12:
+            ajuste = f" (base ×{factor:.2f} por la referencia)" if factor != 1.0 else ""
+            regresiones.append(f"{ruta}: {antes} -> {despues}{ajuste}")
+
+    for grafo, algoritmos in actual['busqueda'].items():
+        previos_grafo = base.get('busqueda', {}).get(grafo, {})
+        factor = escala(previos_grafo, algoritmos)
+        for algoritmo, datos in algoritmos.items():
+            previos = previos_grafo.get(algoritmo)
+            if not previos or algoritmo in ('preparacion_s', 'referencia_ms'):
+                continue
+            revisar(f"{grafo}/{algoritmo}/p50_ms", previos.get('p50_ms'), datos['p50_ms'], umbral_latencia, True,
+                    piso_ms, factor)
+            revisar(f"{grafo}/{algoritmo}/expandidos_medio", previos.get('expandidos_medio'),
+                    datos['expandidos_medio'], umbral_expandidos, True)
+            revisar(f"{grafo}/{algoritmo}/brecha_media_pct", previos.get('brecha_media_pct'),
+                    datos['brecha_media_pct'], umbral_brecha, False)
+    for backend, datos in actual['render'].items():
+        previos = base.get('render', {}).get(backend, {})
+        revisar(f"render/{backend}/p50_ms", previos.get('p50_ms'), datos.get('p50_ms'), umbral_latencia, True, piso_ms,
+                escala(previos, datos))
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda y render con comparación contra una línea base")
+    parser.add_argument('--json', default='conexiones.json')
+    parser.add_argument('--sintetico', type=int, default=10000, metavar='NODOS',
+                        help="Tamaño del grafo sintético (0 para omitirlo)")
+    parser.add_argument('--pares', type=int, default=200, help="Pares al azar sobre el grafo sintético")
+    parser.add_argument('--repeticiones', type=int, default=3, help="Repeticiones por par y por render; cuenta la mejor")
+    parser.add_argument('--render', type=int, default=10, metavar='RUTAS', help="Rutas a renderizar (0 para omitir)")
+    parser.add_argument('--sin-selenium', action='store_true', help="No medir el backend Selenium")
+    parser.add_argument('--salida', default='benchmark_resultados.json')
+    parser.add_argument('--linea-base', default='benchmark_base.json')
+    parser.add_argument('--guardar-base', action='store_true', help="Guardar estos resultados como la nueva línea base")
+    parser.add_argument('--umbral-latencia', type=float, default=0.25, help="Aumento relativo tolerado de p50")
+    parser.add_argument('--piso-ms', type=float, default=0.05, help="Aumento absoluto mínimo de p50 para contar")
+    parser.add_argument('--umbral-expandidos', type=float, default=0.05, help="Aumento relativo tolerado de expansiones")
+    parser.add_argument('--umbral-brecha', type=float, default=0.1, help="Aumento tolerado de la brecha media (puntos %%)")
+    args = parser.parse_args()
+    # Sin línea base no hay nada contra qué comparar: se falla antes de medir
+    if not args.guardar_base and not os.path.exists(args.linea_base):
+        print(f"Sin línea base ('{args.linea_base}'); regístrela en esta máquina con --guardar-base "
+              "sobre un árbol sin cambios", file=sys.stderr)
+        sys.exit(2)
+
+    resultados = ejecutar(args)
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en '{args.salida}'")
+
+    for grafo, algoritmos in resultados['busqueda'].items():
+        print(f"\n{grafo}")
+        for algoritmo, datos in algoritmos.items():
+            if algoritmo not in ('preparacion_s', 'referencia_ms'):
+                print(f"  {algoritmo:>18}: p50 {datos['p50_ms']:8.3f} ms  p99 {datos['p99_ms']:8.3f} ms  "
+                      f"expandidos {datos['expandidos_medio']:9.1f}  brecha {datos['brecha_media_pct']:6.2f}%")
+    for backend, datos in resultados['render'].items():
+        estado = datos['omitido'] if 'omitido' in datos else f"p50 {datos['p50_ms']:.1f} ms"
+        print(f"render {backend}: {estado}")
+
+    if args.guardar_base:
+        with open(args.linea_base, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en '{args.linea_base}'")
+        return
+    with open(args.linea_base, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    regresiones = comparar(resultados, base, args.umbral_latencia, args.umbral_expandidos, args.umbral_brecha,
+                           args.piso_ms)
+    if regresiones:
+        print("\nRegresiones frente a la línea base:")
+        for regresion in regresiones:
+            print(f"  {regresion}")
+        sys.exit(1)
+    print("\nSin regresiones frente a la línea base")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Caché LRU de resultados de ruta e imágenes renderizadas.
+
+Las claves son ``(backend, algoritmo, origen, destino)`` junto con la huella
+de ``conexiones.json``, de modo que un cambio en las conexiones invalida
+todo lo guardado. Opcionalmente persiste las entradas en disco (PNG + JSON).
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from motor_rutas import ResultadoRuta
+
+class CacheRutas:
+    """LRU acotada en memoria con respaldo opcional en ``directorio``"""
+
+    def __init__(self, huella, capacidad=64, directorio=None):
+        self.huella = huella
+        self.capacidad = capacidad
+        self.directorio = directorio
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = OrderedDict()
+        if directorio:
+            os.makedirs(self._carpeta(), exist_ok=True)
+
+    def _carpeta(self):
+        return os.path.join(self.directorio, self.huella[:16])
+
+    def _archivo(self, clave, extension):
+        nombre = hashlib.sha1(json.dumps(clave, ensure_ascii=False).encode('utf-8')).hexdigest()
+        return os.path.join(self._carpeta(), nombre + extension)
+
+    def obtener(self, clave):
+        """``(resultado, imagen)`` guardados para ``clave`` o ``None``"""
+        entrada = self._entradas.get(clave)
+        if entrada is not None:
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+        if self.directorio:
+            entrada = self._leer_disco(clave)
+            if entrada is not None:
+                self._recordar(clave, entrada)
+                self.aciertos += 1
+                return entrada
+        self.fallos += 1
+        return None
+
+    def guardar(self, clave, resultado, imagen):
+        entrada = (resultado, imagen)
+        self._recordar(clave, entrada)
+        if self.directorio:
+            self._escribir_disco(clave, entrada)
+
+    def limpiar(self, huella=None):
+        """Vacía la memoria; con ``huella`` nueva, también cambia de carpeta en disco"""
+        self._entradas.clear()
+        if huella is not None:
+            self.huella = huella
+            if self.directorio:
+                os.makedirs(self._carpeta(), exist_ok=True)
+
+    def invalidar(self, afectada, huella=None):
+        """Descarta de memoria las entradas con ``afectada(clave, resultado, imagen)`` verdadero.
+
+        Sirve tras un cambio de pesos en caliente: lo demás se conserva. Con
+        ``huella`` (la de los pesos vigentes) el disco pasa a otra carpeta, ya
+        que lo guardado allí no se revisa. Devuelve cuántas entradas descartó.
+        """
+        descartadas = [clave for clave, (resultado, imagen) in self._entradas.items()
+                       if afectada(clave, resultado, imagen)]
+        for clave in descartadas:
+            del self._entradas[clave]
+        if huella is not None and huella != self.huella:
+            self.huella = huella
+            if self.directorio:
+                os.makedirs(self._carpeta(), exist_ok=True)
+        return len(descartadas)
+
+    def _recordar(self, clave, entrada):
+        self._entradas[clave] = entrada
+        self._entradas.move_to_end(clave)
+        if len(self._entradas) > self.capacidad:
+            self._entradas.popitem(last=False)
+
+    def _leer_disco(self, clave):
+        from PIL import Image
+
+        try:
+            with open(self._archivo(clave, '.json'), 'r', encoding='utf-8') as f:
+                resultado = ResultadoRuta(**json.load(f))
+            with Image.open(self._archivo(clave, '.png')) as img:
+                imagen = img.copy()
+        except (OSError, ValueError, TypeError):
+            return None
+        return resultado, imagen
+
+    def _escribir_disco(self, clave, entrada):
+        resultado, imagen = entrada
+        imagen.save(self._archivo(clave, '.png'))
+        with open(self._archivo(clave, '.json'), 'w', encoding='utf-8') as f:
+            json.dump(vars(resultado), f, ensure_ascii=False)
+
+    def contadores(self):
+        """Aciertos, fallos, entradas en memoria y capacidad, para exportarlos como números"""
+        return {'aciertos': self.aciertos, 'fallos': self.fallos, 'entradas': len(self._entradas),
+                'capacidad': self.capacidad}
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        tasa = self.aciertos / total * 100 if total else 0.0
+        return f"Caché: {self.aciertos} aciertos / {self.fallos} fallos ({tasa:.0f}%)"
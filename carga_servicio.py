@@ -0,0 +1,108 @@
+"""Prueba de carga para ``servicio_rutas.py``.
+
+Abre ``--conexiones`` conexiones keep-alive que reparten ``--solicitudes``
+consultas ``/route`` entre pares de capitales al azar, y reporta el
+rendimiento (solicitudes/s) y los percentiles de latencia vistos por el
+cliente. Con ``--comparar 1,4`` levanta el servicio con cada número de
+trabajadores en un puerto libre y compara los resultados.
+
+Uso: ``python carga_servicio.py [--host 127.0.0.1 --puerto 8080] [--conexiones 32] [--solicitudes 5000]
+[--algo astar] [--pares 200] [--comparar 1,4]``
+"""
+import argparse
+import asyncio
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+
+from motor_rutas import MotorRutas
+from servicio_rutas import percentiles
+
+async def _cliente(host, puerto, pendientes, latencias, estados):
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    try:
+        while pendientes:
+            objetivo = pendientes.pop()
+            inicio = time.perf_counter()
+            escritor.write(f"GET {objetivo} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1'))
+            await escritor.drain()
+            estado = int((await lector.readline()).split()[1])
+            largo = 0
+            while True:
+                cabecera = await lector.readline()
+                if cabecera in (b'\r\n', b''):
+                    break
+                if cabecera.lower().startswith(b'content-length:'):
+                    largo = int(cabecera.split(b':')[1])
+            await lector.readexactly(largo)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            estados[estado] = estados.get(estado, 0) + 1
+    finally:
+        escritor.close()
+
+async def _carga(host, puerto, objetivos, conexiones):
+    pendientes = list(objetivos)
+    latencias, estados = [], {}
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_cliente(host, puerto, pendientes, latencias, estados) for _ in range(conexiones)))
+    return time.perf_counter() - inicio, latencias, estados
+
+def objetivos_aleatorios(nombres, solicitudes, pares, algo, semilla=0):
+    """URLs ``/route`` sobre ``pares`` pares distintos (se repiten para ejercitar la caché)"""
+    rng = random.Random(semilla)
+    distintos = [rng.sample(nombres, 2) for _ in range(pares)]
+    return [f"/route?from={quote(a)}&to={quote(b)}&algo={algo}"
+            for a, b in (rng.choice(distintos) for _ in range(solicitudes))]
+
+def medir(host, puerto, objetivos, conexiones):
+    duracion, latencias, estados = asyncio.run(_carga(host, puerto, objetivos, conexiones))
+    return {'solicitudes_s': round(len(latencias) / duracion, 1), 'latencia_ms': percentiles(latencias),
+            'estados': estados}
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _con_servicio(trabajadores, json_grafo, funcion):
+    """Levanta el servicio con ``trabajadores`` procesos, ejecuta ``funcion(puerto)`` y lo detiene"""
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, 'servicio_rutas.py', '--json', json_grafo, '--puerto', str(puerto),
+         '--trabajadores', str(trabajadores)],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        proceso.stdout.readline()  # "Sirviendo en ..."
+        return funcion(puerto)
+    finally:
+        proceso.send_signal(signal.SIGINT)
+        proceso.communicate(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de rutas")
+    parser.add_argument('--json', default='conexiones.json')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    parser.add_argument('--conexiones', type=int, default=32)
+    parser.add_argument('--solicitudes', type=int, default=5000)
+    parser.add_argument('--algo', default='astar')
+    parser.add_argument('--pares', type=int, default=200, help="Pares distintos entre los que se reparten las solicitudes")
+    parser.add_argument('--comparar', default=None, metavar='N,M,...',
+                        help="Levantar el servicio con estos números de trabajadores y comparar")
+    args = parser.parse_args()
+
+    objetivos = objetivos_aleatorios(MotorRutas(args.json).capitales, args.solicitudes, args.pares, args.algo)
+    if not args.comparar:
+        print(medir(args.host, args.puerto, objetivos, args.conexiones))
+        return
+    for trabajadores in (int(n) for n in args.comparar.split(',')):
+        resultado = _con_servicio(trabajadores, args.json,
+                                  lambda puerto: medir('127.0.0.1', puerto, objetivos, args.conexiones))
+        print(f"{trabajadores} trabajador(es): {resultado}")
+
+if __name__ == '__main__':
+    main()
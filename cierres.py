@@ -0,0 +1,135 @@
+"""Cierres de vías y cambios de peso en caliente, verificados contra un recálculo completo.
+
+La API está en ``MotorRutas`` (``actualizar_peso``, ``cerrar_via``,
+``reabrir_via``, ``restaurar_pesos``). Este módulo aplica una secuencia de
+cambios al azar (cierres, vías más lentas, reaperturas) y, después de cada
+uno, compara cada algoritmo, la tabla de todos los pares y las rutas que
+una caché conservaría con lo que da Dijkstra sobre una copia del grafo.
+
+Uso: ``python cierres.py [conexiones.json] [--cambios 40] [--pares 200] [--sintetico 2000]``
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from motor_rutas import GrafoCSR, distancias_desde
+
+def _copia(grafo):
+    return GrafoCSR(grafo.nombres, grafo.offsets, grafo.destinos, np.array(grafo.pesos))
+
+def _largo(grafo, ids):
+    """Suma de los pesos del camino; ``inf`` si usa una vía cerrada o inexistente"""
+    total = 0.0
+    for u, v in zip(ids, ids[1:]):
+        total += min((peso for w, peso in grafo.vecinos(u) if w == v), default=math.inf)
+    return total
+
+def _igual(a, b):
+    if math.isinf(a) or math.isinf(b):
+        return a == b
+    return abs(a - b) <= 1e-6 * max(1.0, b)
+
+def _cambio_al_azar(motor, rng, vias):
+    """Cierra, encarece o reabre una vía al azar; devuelve (descripción, cambios)"""
+    modificadas = motor.vias_modificadas()
+    if modificadas and rng.random() < 0.3:
+        origen, destino, _, _ = modificadas[rng.integers(len(modificadas))]
+        return f"reabrir {origen} - {destino}", motor.reabrir_via(origen, destino)
+    origen, destino = vias[rng.integers(len(vias))]
+    if rng.random() < 0.5:
+        return f"cerrar {origen} - {destino}", motor.cerrar_via(origen, destino)
+    factor = float(rng.uniform(1.1, 3.0))
+    peso = motor._peso_original(motor.id_ciudad(origen), motor.id_ciudad(destino)) * factor
+    return f"{origen} - {destino} ×{factor:.2f}", motor.actualizar_peso(origen, destino, peso)
+
+def verificar(motor, cambios=40, pares=200, semilla=0):
+    """Errores encontrados al comparar cada cambio con el recálculo completo"""
+    from tabla_rutas import floyd_warshall
+
+    rng = np.random.default_rng(semilla)
+    grafo = motor.grafo
+    nombres = grafo.nombres
+    vias = sorted({tuple(sorted((nombres[i], nombres[j]))) for i in range(grafo.n) for j, _ in grafo.vecinos(i)})
+    muestra = [(nombres[i], nombres[j]) for i, j in rng.integers(grafo.n, size=(pares, 2)) if i != j]
+    algoritmos = [a for a in motor.algoritmos if a != 'voraz']
+    errores = 0
+    conservadas = invalidadas = 0
+
+    def error(mensaje):
+        nonlocal errores
+        errores += 1
+        if errores <= 10:
+            print(f"  ERROR {mensaje}")
+
+    for paso in range(cambios):
+        # Lo que una caché tendría guardado antes del cambio
+        guardadas = [r for r in (motor.ruta(o, d, 'a_estrella') for o, d in muestra) if r is not None]
+        inicio = time.perf_counter()
+        descripcion, aplicados = _cambio_al_azar(motor, rng, vias)
+        ms = (time.perf_counter() - inicio) * 1000
+
+        referencia = _copia(grafo)
+        exactas = {}
+        for origen in {o for o, _ in muestra}:
+            exactas[origen] = distancias_desde(referencia, grafo.indice[origen])
+        for origen, destino in muestra:
+            esperada = exactas[origen][grafo.indice[destino]]
+            for algoritmo in algoritmos:
+                resultado = motor.ruta(origen, destino, algoritmo)
+                distancia = math.inf if resultado is None else resultado.distancia
+                if not _igual(distancia, esperada):
+                    error(f"{algoritmo} {origen} -> {destino}: {distancia} en lugar de {esperada}")
+                elif resultado is not None and not _igual(_largo(referencia, [grafo.indice[c] for c in resultado.ruta]), esperada):
+                    error(f"{algoritmo} {origen} -> {destino}: el camino no suma su distancia")
+            voraz = motor.ruta(origen, destino, 'voraz')
+            if voraz is not None and math.isinf(_largo(referencia, [grafo.indice[c] for c in voraz.ruta])):
+                error(f"voraz {origen} -> {destino}: usa una vía cerrada")
+
+        for resultado in guardadas:
+            if motor.ruta_afectada(resultado, aplicados):
+                invalidadas += 1
+                continue
+            conservadas += 1
+            esperada = exactas[resultado.ruta[0]][grafo.indice[resultado.ruta[-1]]]
+            if not _igual(resultado.distancia, esperada):
+                error(f"caché: {resultado.ruta[0]} -> {resultado.ruta[-1]} se conservó con {resultado.distancia}, "
+                      f"ahora {esperada}")
+
+        if motor.tabla is not None:
+            dist, _ = floyd_warshall(referencia)
+            if not np.allclose(motor.tabla.dist, dist, rtol=1e-9, equal_nan=False):
+                error(f"tabla distinta de Floyd–Warshall tras '{descripcion}'")
+        print(f"{paso + 1:3d}. {descripcion} ({ms:.2f} ms)")
+
+    motor.restaurar_pesos()
+    if motor.vias_modificadas():
+        error("restaurar_pesos dejó vías modificadas")
+    print(f"Rutas en caché conservadas: {conservadas}, invalidadas: {invalidadas}")
+    return errores
+
+if __name__ == '__main__':
+    from motor_rutas import MotorRutas
+
+    parser = argparse.ArgumentParser(description="Verifica los cambios de peso en caliente contra un recálculo completo")
+    parser.add_argument('json', nargs='?', default='conexiones.json')
+    parser.add_argument('--cambios', type=int, default=40, help="Cambios al azar a aplicar")
+    parser.add_argument('--pares', type=int, default=200, help="Pares comparados después de cada cambio")
+    parser.add_argument('--sintetico', type=int, default=0, metavar='NODOS',
+                        help="Usar un grafo sintético de este tamaño en lugar del JSON (sin tabla)")
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.sintetico:
+        from grafo_sintetico import generar_grafo
+
+        motor = generar_grafo(args.sintetico)
+    else:
+        motor = MotorRutas(args.json)
+        motor.cargar_tabla()
+    motor.cargar_hitos()
+    motor.cargar_jerarquia()
+    errores = verificar(motor, args.cambios, args.pares, args.semilla)
+    print("Sin diferencias con el recálculo completo" if not errores else f"{errores} diferencias")
+    raise SystemExit(1 if errores else 0)
@@ -1,63 +1,121 @@
 import tkinter as tk
 from tkinter import ttk
-import json
+import io
+import logging
 import math
-from queue import PriorityQueue
-import folium
-from folium.plugins import MousePosition
-from PIL import Image, ImageTk, ImageEnhance
 import os
+import pathlib
+import sqlite3
+import tempfile
+import threading
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
+from cache_rutas import CacheRutas
+from metricas import Metricas, medir
+from motor_rutas import MotorRutas, coordenadas
+from teselas import ATRIBUCION, AlmacenTeselas, ServidorTeselas
+from trabajador_render import TrabajadorRender
 
-# Coordenadas de las capitales
-coordenadas = {
-    'Leticia': (-4.2129211, -69.9425963),
-    'Medellín': (6.269732449999999, -75.60255965090315),
-    'Arauca': (6.6666755, -71.0000086),
-    'Barranquilla': (11.0101922, -74.8231794084391),
-    'Cartagena de Indias': (10.4265566, -75.5441671),
-    'Tunja': (5.5324313, -73.3616014),
-    'Manizales': (5.0743694, -75.50811667440546),
-    'Florencia': (1.6158666, -75.6143045),
-    'Yopal': (5.3356662, -72.3936931),
-    'Popayán': (2.4422295, -76.6072368),
-    'Valledupar': (10.34311145, -73.37579338828454),
-    'Quibdó': (5.6923407, -76.6583801),
-    'Montería': (8.6046053, -75.97832027208273),
-    'Bogotá': (4.6533816, -74.0836333),
-    'Inírida': (3.8650368, -67.9259848),
-    'San José del Guaviare': (2.5716141, -72.6426515),
-    'Neiva': (2.9257038, -75.2893937),
-    'Riohacha': (11.236191300000002, -72.88204560476245),
-    'Santa Marta': (11.2320944, -74.1950916),
-    'Villavicencio': (4.1347644, -73.6201517),
-    'Pasto': (1.2140275, -77.2785096),
-    'San José de Cúcuta': (8.07761875, -72.46890019811272),
-    'Mocoa': (1.1466295, -76.6482327),
-    'Armenia': (4.491976149999999, -75.74135085294314),
-    'Pereira': (4.7854606, -75.7883220137654),
-    'San Andrés': (12.537597850000001, -81.72041550499901),
-    'Bucaramanga': (7.16698415, -73.1047294009737),
-    'Sincelejo': (9.2973386, -75.3926601),
-    'Ibagué': (4.4386033, -75.2108857),
-    'Cali': (3.4519988, -76.5325259),
-    'Mitú': (1.2538499, -70.2345576),
-    'Puerto Carreño': (6.1909225, -67.4841891)
+# folium, Selenium y PIL se importan al primer uso: la ventana y el motor de
+# rutas quedan disponibles antes de que el backend del mapa termine de cargar
+log = logging.getLogger('rutas.inicio')
+_T0 = time.perf_counter()
+# Segundos para ordenar muchas paradas (más de ``paradas.LIMITE_EXACTO``) desde la ventana
+PRESUPUESTO_PARADAS_S = 0.3
+
+def _registrar_fase(fase, inicio):
+    """Registra la duración de una fase de arranque y el tiempo desde el inicio del proceso"""
+    ahora = time.perf_counter()
+    log.info("%s: %.1f ms (t=%.1f ms)", fase, (ahora - inicio) * 1000, (ahora - _T0) * 1000)
+
+# Reemplaza la capa de ruta en el mapa Leaflet ya cargado, ajusta la vista y
+# llama al callback cuando las teselas visibles cargaron y se pintó un cuadro
+_JS_ACTUALIZAR_Y_ESPERAR = """
+var mapa = window[arguments[0]], geojson = arguments[1], limites = arguments[2];
+var listo = arguments[arguments.length - 1];
+if (window.__capaRuta) {
+    mapa.removeLayer(window.__capaRuta);
+    window.__capaRuta = null;
+}
+if (geojson) {
+    window.__capaRuta = L.geoJSON(geojson, {
+        style: function () {
+            return {color: '#2980B9', weight: 6.5, opacity: 1.0, lineCap: 'round'};
+        },
+        pointToLayer: function (feature, latlng) {
+            return L.circleMarker(latlng, {
+                radius: 9, color: '#27AE60', fillColor: '#27AE60',
+                fillOpacity: 1.0, weight: 2
+            }).bindPopup(feature.properties.nombre);
+        }
+    }).addTo(mapa);
+}
+if (limites) {
+    mapa.fitBounds(limites, {padding: [30, 30], animate: false});
+}
+var teselas = null;
+mapa.eachLayer(function (capa) {
+    if (capa instanceof L.TileLayer) { teselas = capa; }
+});
+function pintado() {
+    requestAnimationFrame(function () { requestAnimationFrame(function () { listo(true); }); });
 }
+if (teselas && teselas.isLoading()) {
+    teselas.once('load', pintado);
+} else {
+    pintado();
+}
+"""
+
+def _tabla_ajuste(media, contraste=1.3, brillo=1.1):
+    """LUT equivalente a ImageEnhance.Contrast(contraste) seguido de ImageEnhance.Brightness(brillo)"""
+    tabla = []
+    for valor in range(256):
+        valor = min(max(media + contraste * (valor - media), 0), 255)
+        tabla.append(int(min(brillo * valor, 255)))
+    return tabla
 
 class MapaInteractivo(tk.Frame):
-    def __init__(self, parent, datos_conexiones, *args, **kwargs):
+    def __init__(self, parent, datos_conexiones, *args, backend='selenium', rapido=False, ubicaciones=None,
+                 **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.datos = datos_conexiones
-        self.setup_selenium()
+        # ``{nombre: (lat, lon)}`` de los nodos que se dibujan; por omisión, las capitales
+        self.ubicaciones = coordenadas if ubicaciones is None else ubicaciones
+        # 'selenium': folium + captura con Chrome; 'raster': dibujo directo con PIL
+        self.backend = backend
+        # Modo rápido: filtro bilineal en vez de LANCZOS al reducir la captura
+        self.rapido = rapido
+        self._imagen_base = None
+        self._pagina_actual = None
+        self._backend_listo = False
+        self._bloqueo_backend = threading.Lock()
+        # Pares (ciudad, destino) de vías cerradas en el motor: las dibujadas y las por dibujar
+        self.cerradas = frozenset()
+        self._cerradas_nuevas = self.cerradas
         self.setup_ui()
+        self.trabajador = TrabajadorRender(self)
         self.setup_mapa_base()
+    
+    def _asegurar_backend(self):
+        """Arranca el backend del mapa (Chrome o el renderizador PIL) una sola vez, fuera del hilo de Tk"""
+        with self._bloqueo_backend:
+            if self._backend_listo:
+                return
+            inicio = time.perf_counter()
+            if self.backend == 'raster':
+                from render_raster import RenderizadorRaster
+                self.raster = RenderizadorRaster(self.datos, ubicaciones=self.ubicaciones)
+            else:
+                self.setup_selenium()
+                self._teselas = self._configurar_teselas()
+            self._backend_listo = True
+            _registrar_fase(f"backend del mapa ({self.backend})", inicio)
         
     def setup_selenium(self):
         """Configuración optimizada para máxima calidad visual"""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        
         chrome_options = Options()
         chrome_options.add_argument("--headless")
         chrome_options.add_argument("--window-size=850,850")
@@ -66,6 +124,23 @@ class MapaInteractivo(tk.Frame):
         chrome_options.add_argument("--hide-scrollbars")
         chrome_options.add_argument("--force-device-scale-factor=1.5")
         self.driver = webdriver.Chrome(options=chrome_options)
+        self.driver.set_script_timeout(5)
+        # HTML en un directorio privado: varias instancias no chocan en el directorio de trabajo
+        self._temporal = tempfile.TemporaryDirectory(prefix='rutas_')
+    
+    def _configurar_teselas(self):
+        """Teselas de OpenStreetMap o, si RUTAS_TESELAS apunta a un .mbtiles válido, las del almacén local"""
+        ruta = os.environ.get('RUTAS_TESELAS')
+        if not ruta:
+            return {'tiles': 'OpenStreetMap'}
+        try:
+            almacen = AlmacenTeselas(ruta, solo_lectura=True)
+        except sqlite3.Error as error:
+            log.warning("RUTAS_TESELAS=%r no es un almacén de teselas utilizable (%s); se usan las de OpenStreetMap",
+                        ruta, error)
+            return {'tiles': 'OpenStreetMap'}
+        self.servidor_teselas = ServidorTeselas(almacen).iniciar()
+        return {'tiles': self.servidor_teselas.url_plantilla, 'attr': ATRIBUCION}
     
     def setup_ui(self):
         """Configuración de la interfaz gráfica"""
@@ -73,13 +148,62 @@ class MapaInteractivo(tk.Frame):
         self.browser_frame.pack(fill=tk.BOTH, expand=True)
         self.label = tk.Label(self.browser_frame)
         self.label.pack(fill=tk.BOTH, expand=True)
+        # Clic izquierdo: origen; clic derecho: destino (solo backend raster)
+        self.al_seleccionar = None
+        self._limites_mostrados = None
+        self.label.bind('<Button-1>', lambda event: self._clic_en_mapa(event, 1))
+        self.label.bind('<Button-3>', lambda event: self._clic_en_mapa(event, 3))
+    
+    def setup_mapa_base(self, renderizar=None):
+        """Solicita el mapa base en segundo plano; mientras tanto se muestra un aviso"""
+        self.label.config(text="Cargando mapa…", compound=tk.CENTER, font=('Arial', 14, 'bold'))
+        
+        def mostrar(img):
+            from render_raster import LIMITES_COLOMBIA
+            
+            self.mostrar_imagen(img, LIMITES_COLOMBIA)
+            _registrar_fase("primer mapa", _T0)
+        
+        def fallar(error):
+            self.label.config(text=f"Error al cargar el mapa: {error}")
+        
+        self.trabajador.solicitar(renderizar or self._renderizar_base, al_terminar=mostrar, al_fallar=fallar)
     
-    def setup_mapa_base(self):
+    def marcar_cerradas(self, cerradas):
+        """Redibuja el mapa base con ``cerradas`` (pares ciudad, destino) marcadas como vías cerradas"""
+        self._cerradas_nuevas = frozenset(cerradas)
+        self._imagen_base = None
+        self.setup_mapa_base()
+    
+    def _sincronizar_cerradas(self):
+        """Aplica las vías cerradas pendientes; se llama en el hilo de render, antes de dibujar.
+        
+        Así el cambio no ocurre a mitad de otro render, y llega aunque una
+        solicitud posterior reemplace a la del mapa base.
+        """
+        if self._cerradas_nuevas == self.cerradas:
+            return
+        self.cerradas = self._cerradas_nuevas
+        # La página de rutas de Selenium trae la red dibujada: se arma de nuevo
+        self._pagina_actual = None
+        if self.backend == 'raster':
+            self.raster.marcar_cerradas(self.cerradas)
+    
+    def _renderizar_base(self):
         """Crea el mapa base con zoom y área ajustados para Colombia completa"""
+        self._asegurar_backend()
+        self._sincronizar_cerradas()
+        if self.backend == 'raster':
+            self._imagen_base = self.raster.render_base()
+            return self._imagen_base
+        
+        import folium
+        from folium.plugins import MousePosition
+        
         self.mapa = folium.Map(
             location=[4.0, -74.0],
             zoom_start=5.8,
-            tiles='OpenStreetMap',
+            **self._teselas,
             control_scale=True,
             width='850px',
             height='850px',
@@ -101,26 +225,30 @@ class MapaInteractivo(tk.Frame):
         
         MousePosition().add_to(self.mapa)
         self._add_base_elements()
-        self._capture_and_show_map()
+        return self._capturar_mapa_base()
     
     def _add_base_elements(self):
         """Añade elementos al mapa con colores vibrantes y máxima opacidad"""
-        # Conexiones base
+        import folium
+        
+        # Conexiones base; las cerradas en rojo y punteadas
         for ciudad, conexiones in self.datos['conexiones'].items():
-            if ciudad in coordenadas:
+            if ciudad in self.ubicaciones:
                 for destino, distancia in conexiones.items():
-                    if destino in coordenadas:
+                    if destino in self.ubicaciones:
+                        cerrada = (ciudad, destino) in self.cerradas
                         folium.PolyLine(
-                            locations=[coordenadas[ciudad], coordenadas[destino]],
-                            color='#E67E22',
+                            locations=[self.ubicaciones[ciudad], self.ubicaciones[destino]],
+                            color='#C0392B' if cerrada else '#E67E22',
                             weight=4.5,
                             opacity=1.0,
                             line_cap='round',
-                            tooltip=f"{ciudad} - {destino}: {distancia} km"
+                            dash_array='10 8' if cerrada else None,
+                            tooltip=f"{ciudad} - {destino}: " + ("cerrada" if cerrada else f"{distancia} km")
                         ).add_to(self.mapa)
         
         # Marcadores base
-        for ciudad, (lat, lon) in coordenadas.items():
+        for ciudad, (lat, lon) in self.ubicaciones.items():
             folium.CircleMarker(
                 location=[lat, lon],
                 radius=7.5,
@@ -144,9 +272,9 @@ class MapaInteractivo(tk.Frame):
         ]
         self.mapa.fit_bounds(bounds, padding=(20, 20))
     
-    def _capture_and_show_map(self):
+    def _capturar_mapa_base(self):
         """Captura el mapa con alta calidad y ajustes precisos"""
-        temp_html = 'temp_map.html'
+        temp_html = os.path.join(self._temporal.name, 'mapa.html')
         self.mapa.save(temp_html)
         
         with open(temp_html, 'a') as f:
@@ -162,40 +290,138 @@ class MapaInteractivo(tk.Frame):
             </script>
             """)
         
-        self.driver.get(f"file:///{os.path.abspath(temp_html)}")
-        WebDriverWait(self.driver, 5).until(
-            lambda d: d.execute_script('return document.readyState') == 'complete'
-        )
-        time.sleep(1.5)
-        
-        temp_png = 'temp_map.png'
-        self.driver.save_screenshot(temp_png)
-        
-        img = Image.open(temp_png)
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.3)
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(1.1)
-        img = img.resize((800, 800), Image.LANCZOS)
+        self._cargar_pagina(temp_html)
+        self._pagina_actual = 'base'
+        self._esperar_render()
         
-        img_tk = ImageTk.PhotoImage(img)
+        img = self._capturar_imagen()
         
-        self.label.config(image=img_tk)
-        self.label.image = img_tk
+        self._imagen_base = img
         
         os.remove(temp_html)
-        os.remove(temp_png)
+        return img
     
     def mostrar_ruta(self, ruta):
-        """Muestra la ruta completa sin cortes con zoom ajustado"""
+        """Muestra la ruta completa sin cortes con zoom ajustado y devuelve la imagen"""
+        img = self.renderizar_ruta(ruta)
+        if img is not None:
+            self.mostrar_imagen(img, self._limites_de_ruta(ruta))
+        return img
+    
+    def mostrar_ruta_cacheada(self, img, ruta):
+        """Muestra una imagen de ruta ya renderizada, descartando renders en curso"""
+        self.cancelar_render()
+        self.mostrar_imagen(img, self._limites_de_ruta(ruta))
+    
+    def _limites_de_ruta(self, ruta):
+        from render_raster import limites_ruta
+        
+        return limites_ruta([self.ubicaciones[ciudad] for ciudad in ruta if ciudad in self.ubicaciones])
+    
+    def solicitar_ruta(self, ruta, al_terminar=None, metricas=None):
+        """Renderiza la ruta en segundo plano; una solicitud nueva reemplaza a la anterior"""
+        self.label.config(text="Renderizando ruta…", compound=tk.CENTER, font=('Arial', 14, 'bold'))
+        
+        def terminar(img):
+            if img is None:
+                self.label.config(text='')
+                return
+            with medir(metricas, 'mostrar'):
+                self.mostrar_imagen(img, self._limites_de_ruta(ruta))
+            if al_terminar is not None:
+                al_terminar(img)
+        
+        def fallar(error):
+            self.label.config(text=f"Error al renderizar: {error}")
+        
+        self.trabajador.solicitar(self.renderizar_ruta, ruta, metricas, al_terminar=terminar, al_fallar=fallar)
+    
+    def solicitar_calculo(self, calcular, al_terminar, metricas=None):
+        """Como ``solicitar_ruta``, pero la ruta sale de ``calcular()``, que también corre en el hilo de render.
+        
+        ``calcular`` devuelve un resultado con ``ruta`` o ``None``; ``al_terminar(resultado, img)``
+        se llama en el hilo de Tk, con ``img`` en ``None`` si no hubo ruta que dibujar.
+        """
+        self.label.config(text="Calculando ruta…", compound=tk.CENTER, font=('Arial', 14, 'bold'))
+        
+        def trabajo():
+            resultado = calcular()
+            if resultado is None:
+                return None, None
+            return resultado, self.renderizar_ruta(resultado.ruta, metricas)
+        
+        def terminar(valor):
+            resultado, img = valor
+            if img is None:
+                self.label.config(text='')
+            else:
+                with medir(metricas, 'mostrar'):
+                    self.mostrar_imagen(img, self._limites_de_ruta(resultado.ruta))
+            al_terminar(resultado, img)
+        
+        def fallar(error):
+            self.label.config(text=f"Error al calcular la ruta: {error}")
+        
+        self.trabajador.solicitar(trabajo, al_terminar=terminar, al_fallar=fallar)
+    
+    def cancelar_render(self):
+        """Descarta cualquier render de ruta pendiente o en curso"""
+        self.trabajador.cancelar()
+    
+    def renderizar_ruta(self, ruta, metricas=None):
+        """Genera la imagen de la ruta sin tocar widgets (se puede llamar desde otro hilo)"""
         if not ruta or len(ruta) < 2:
-            return
+            return None
+        
+        with medir(metricas, 'backend'):
+            self._asegurar_backend()
+        self._sincronizar_cerradas()
+        if self.backend == 'raster':
+            with medir(metricas, 'dibujo'):
+                return self.raster.render_ruta(ruta)
+        
+        # La página de rutas se carga una sola vez; cada consulta solo inyecta la capa
+        if self._pagina_actual != 'ruta':
+            self._preparar_pagina_ruta(metricas)
+        
+        from render_raster import limites_ruta
+        
+        puntos_ruta = [self.ubicaciones[ciudad] for ciudad in ruta if ciudad in self.ubicaciones]
+        with medir(metricas, 'espera render'):
+            self._esperar_render(self._geojson_ruta(ruta), limites_ruta(puntos_ruta))
+        
+        return self._capturar_imagen(metricas)
+    
+    def _preparar_pagina_ruta(self, metricas=None):
+        """Carga en el driver la página base de rutas (red con opacidad reducida)"""
+        with medir(metricas, 'folium'):
+            temp_map = self._mapa_ruta()
+        
+        with medir(metricas, 'html'):
+            temp_html = os.path.join(self._temporal.name, 'ruta.html')
+            temp_map.save(temp_html)
             
-        # Crear mapa temporal
+            with open(temp_html, 'a') as f:
+                f.write("""
+                <style>
+                    body { background: white !important; }
+                </style>
+                """)
+        
+        with medir(metricas, 'carga página'):
+            self._cargar_pagina(temp_html)
+        self._nombre_mapa_ruta = temp_map.get_name()
+        self._pagina_actual = 'ruta'
+        os.remove(temp_html)
+    
+    def _mapa_ruta(self):
+        """Mapa folium de la página de rutas: red base con opacidad reducida"""
+        import folium
+        
         temp_map = folium.Map(
             location=[5.0, -74.0],
             zoom_start=5.5,
-            tiles='OpenStreetMap',
+            **self._teselas,
             width='850px',
             height='850px',
             prefer_canvas=True,
@@ -217,113 +443,44 @@ class MapaInteractivo(tk.Frame):
         
         # Añadir elementos base con opacidad reducida
         self._add_base_elements_to_map(temp_map)
-        
-        # Obtener coordenadas de la ruta
-        puntos_ruta = [coordenadas[ciudad] for ciudad in ruta if ciudad in coordenadas]
-        
-        # Añadir ruta resaltada
-        folium.PolyLine(
-            locations=puntos_ruta,
-            color='#2980B9',
-            weight=6.5,
-            opacity=1.0,
-            line_cap='round',
-            tooltip="Ruta encontrada"
-        ).add_to(temp_map)
-        
-        # Añadir marcadores especiales para la ruta
-        for ciudad in ruta:
-            if ciudad in coordenadas:
-                folium.CircleMarker(
-                    location=coordenadas[ciudad],
-                    radius=9,
-                    popup=ciudad,
-                    color='#27AE60',
-                    fill=True,
-                    fill_color='#27AE60',
-                    fill_opacity=1.0,
-                    stroke=True,
-                    weight=2
-                ).add_to(temp_map)
-        
-        # Calcular los límites óptimos para la ruta
-        self._ajustar_vista_ruta(temp_map, puntos_ruta)
-        
-        # Capturar y mostrar el mapa
-        self._capture_and_show_temp_map(temp_map)
-    
-    def _ajustar_vista_ruta(self, mapa, puntos_ruta):
-        """Ajuste de vista mejorado que garantiza que la ruta nunca se corte"""
-        if not puntos_ruta or len(puntos_ruta) < 2:
-            return
-
-        # Calcular los límites geográficos de la ruta
-        lats = [p[0] for p in puntos_ruta]
-        lons = [p[1] for p in puntos_ruta]
-        
-        min_lat, max_lat = min(lats), max(lats)
-        min_lon, max_lon = min(lons), max(lons)
-        
-        # Calcular la extensión de la ruta
-        lat_span = max_lat - min_lat
-        lon_span = max_lon - min_lon
-        
-        # Asegurar un mínimo de extensión para evitar zoom excesivo
-        min_span = 3.0  # Aumentado a 3 grados
-        lat_span = max(lat_span, min_span)
-        lon_span = max(lon_span, min_span)
-        
-        # Padding dinámico basado en la extensión de la ruta
-        padding_factor = 0.35  # Aumentado a 35% de padding
-        
-        # Aplicar padding
-        south = min_lat - (lat_span * padding_factor)
-        north = max_lat + (lat_span * padding_factor)
-        west = min_lon - (lon_span * padding_factor)
-        east = max_lon + (lon_span * padding_factor)
-        
-        # Asegurar que no nos salgamos de los límites de Colombia
-        south = max(south, -4.5)
-        north = min(north, 13.0)
-        west = max(west, -82.0)
-        east = min(east, -66.0)
-        
-        # Ajustar relación de aspecto para que se adapte mejor a la ventana
-        window_aspect = 1.0
-        route_aspect = lon_span / lat_span
-        
-        if route_aspect > window_aspect:
-            # Ruta más ancha que alta
-            desired_lon_span = lon_span
-            desired_lat_span = desired_lon_span / window_aspect
-            delta_lat = (desired_lat_span - lat_span) / 2
-            south = max(south - delta_lat, -4.5)
-            north = min(north + delta_lat, 13.0)
-        else:
-            # Ruta más alta que ancha
-            desired_lat_span = lat_span
-            desired_lon_span = desired_lat_span * window_aspect
-            delta_lon = (desired_lon_span - lon_span) / 2
-            west = max(west - delta_lon, -82.0)
-            east = min(east + delta_lon, -66.0)
-        
-        # Aplicar los nuevos límites con padding adicional
-        mapa.fit_bounds([[south, west], [north, east]], padding=(30, 30))
+        return temp_map
+    
+    def _geojson_ruta(self, ruta):
+        """Ruta como FeatureCollection: la polilínea y un punto por ciudad"""
+        ciudades = [ciudad for ciudad in ruta if ciudad in self.ubicaciones]
+        linea = {
+            'type': 'Feature',
+            'properties': {'tipo': 'ruta'},
+            'geometry': {
+                'type': 'LineString',
+                'coordinates': [[self.ubicaciones[c][1], self.ubicaciones[c][0]] for c in ciudades]
+            }
+        }
+        puntos = [{
+            'type': 'Feature',
+            'properties': {'tipo': 'ciudad', 'nombre': ciudad},
+            'geometry': {'type': 'Point', 'coordinates': [self.ubicaciones[ciudad][1], self.ubicaciones[ciudad][0]]}
+        } for ciudad in ciudades]
+        return {'type': 'FeatureCollection', 'features': [linea] + puntos}
     
     def _add_base_elements_to_map(self, map_obj):
         """Añade elementos base con opacidad reducida"""
+        import folium
+        
         for ciudad, conexiones in self.datos['conexiones'].items():
-            if ciudad in coordenadas:
+            if ciudad in self.ubicaciones:
                 for destino, distancia in conexiones.items():
-                    if destino in coordenadas:
+                    if destino in self.ubicaciones:
+                        cerrada = (ciudad, destino) in self.cerradas
                         folium.PolyLine(
-                            locations=[coordenadas[ciudad], coordenadas[destino]],
-                            color='#E67E22',
+                            locations=[self.ubicaciones[ciudad], self.ubicaciones[destino]],
+                            color='#C0392B' if cerrada else '#E67E22',
                             weight=3.5,
-                            opacity=0.7
+                            opacity=0.9 if cerrada else 0.7,
+                            dash_array='10 8' if cerrada else None
                         ).add_to(map_obj)
         
-        for ciudad, (lat, lon) in coordenadas.items():
+        for ciudad, (lat, lon) in self.ubicaciones.items():
             folium.CircleMarker(
                 location=[lat, lon],
                 radius=5,
@@ -333,50 +490,78 @@ class MapaInteractivo(tk.Frame):
                 fill_opacity=0.7
             ).add_to(map_obj)
     
-    def _capture_and_show_temp_map(self, temp_map):
-        """Captura el mapa temporal con alta calidad"""
-        temp_html = 'temp_ruta.html'
-        temp_map.save(temp_html)
+    def _cargar_pagina(self, temp_html):
+        """Navega el driver a un HTML local y espera a que el documento esté completo"""
+        from selenium.webdriver.support.ui import WebDriverWait
         
-        with open(temp_html, 'a') as f:
-            f.write("""
-            <style>
-                body { background: white !important; }
-            </style>
-            <script>
-                setTimeout(function() {
-                    window.scrollTo(0, 0);
-                }, 1500);
-            </script>
-            """)
-        
-        self.driver.get(f"file:///{os.path.abspath(temp_html)}")
+        self.driver.get(pathlib.Path(temp_html).resolve().as_uri())
         WebDriverWait(self.driver, 5).until(
             lambda d: d.execute_script('return document.readyState') == 'complete'
         )
-        time.sleep(2)
-        
-        temp_png = 'temp_ruta.png'
-        self.driver.save_screenshot(temp_png)
-        
-        img = Image.open(temp_png)
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.3)
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(1.1)
-        img = img.resize((800, 800), Image.LANCZOS)
+    
+    def _esperar_render(self, geojson=None, limites=None):
+        """Actualiza la capa de ruta y vuelve cuando Leaflet terminó de cargar teselas y pintar"""
+        from selenium.common.exceptions import TimeoutException
+        
+        nombre = self._nombre_mapa_ruta if self._pagina_actual == 'ruta' else self.mapa.get_name()
+        try:
+            self.driver.execute_async_script(_JS_ACTUALIZAR_Y_ESPERAR, nombre, geojson, limites)
+        except TimeoutException:
+            # Sin red las teselas nunca terminan; se captura lo que haya
+            pass
+    
+    def _capturar_imagen(self, metricas=None):
+        """Captura el driver en memoria, la reduce a 800x800 y aplica contraste y brillo en una pasada"""
+        from PIL import Image, ImageStat
+        
+        with medir(metricas, 'captura'):
+            img = Image.open(io.BytesIO(self.driver.get_screenshot_as_png())).convert('RGB')
+        with medir(metricas, 'redimensión'):
+            if self.rapido:
+                img = img.resize((800, 800), Image.BILINEAR, reducing_gap=2.0)
+            else:
+                img = img.resize((800, 800), Image.LANCZOS)
+        
+        # Se ajusta después de reducir: 2.5 veces menos píxeles que la captura a escala 1.5
+        with medir(metricas, 'ajuste'):
+            media = int(ImageStat.Stat(img.convert('L')).mean[0] + 0.5)
+            return img.point(_tabla_ajuste(media) * 3)
+    
+    def mostrar_imagen(self, img, limites=None):
+        """Muestra una imagen PIL en el panel del mapa; ``limites`` permite traducir clics a lat/lon"""
+        from PIL import ImageTk
         
         img_tk = ImageTk.PhotoImage(img)
         
-        self.label.config(image=img_tk)
+        self.label.config(image=img_tk, text='')
         self.label.image = img_tk
+        self._limites_mostrados = limites
+    
+    def _clic_en_mapa(self, event, boton):
+        """Convierte el clic a lat/lon con la proyección del renderizador PIL y avisa a ``al_seleccionar``"""
+        if self.backend != 'raster' or self._limites_mostrados is None or self.al_seleccionar is None:
+            return
+        from render_raster import Proyeccion
         
-        os.remove(temp_html)
-        os.remove(temp_png)
+        imagen = self.label.image
+        # La imagen está centrada dentro del Label
+        x = event.x - (self.label.winfo_width() - imagen.width()) / 2
+        y = event.y - (self.label.winfo_height() - imagen.height()) / 2
+        if not (0 <= x < imagen.width() and 0 <= y < imagen.height()):
+            return
+        proyeccion = Proyeccion(self._limites_mostrados, imagen.width(), imagen.height())
+        self.al_seleccionar(*proyeccion.a_latlon(x, y), boton)
     
     def reiniciar_vista(self):
         """Restablece la vista inicial enfocada en Colombia"""
-        self.setup_mapa_base()
+        self.cancelar_render()
+        # El mapa base no cambia entre consultas: se reutiliza la imagen ya capturada
+        if self._imagen_base is not None:
+            from render_raster import LIMITES_COLOMBIA
+            
+            self.mostrar_imagen(self._imagen_base, LIMITES_COLOMBIA)
+        else:
+            self.setup_mapa_base()
 
 class MapaColombiaConBusqueda:
     def __init__(self, root):
@@ -384,14 +569,24 @@ class MapaColombiaConBusqueda:
         self.root.title("Rutas por Colombia - Versión Definitiva HD")
         self.root.geometry("1250x900")
         
-        with open('conexiones.json', 'r', encoding='utf-8') as f:
-            self.datos = json.load(f)
-        
-        self.ciudades_ordenadas = sorted(self.datos['capitales'])
-        self.heuristic_cache = {}
-        
+        inicio = time.perf_counter()
+        self.motor = MotorRutas('conexiones.json')
+        self.datos = self.motor.datos
+        self.ciudades_ordenadas = self.motor.ciudades_ordenadas
+        self.cache = CacheRutas(self.motor.huella, directorio=os.environ.get('RUTAS_CACHE_DIR'))
+        _registrar_fase("motor de rutas", inicio)
+        # La tabla de todos los pares no hace falta para la primera consulta: hasta
+        # que esté cargada, la ruta óptima se busca con A*
+        threading.Thread(target=self._cargar_tabla, daemon=True).start()
+        
+        inicio = time.perf_counter()
         self._setup_ui()
-        self._precompute_grafo()
+        _registrar_fase("ventana y controles", inicio)
+    
+    def _cargar_tabla(self):
+        inicio = time.perf_counter()
+        self.motor.cargar_tabla()
+        _registrar_fase("tabla de todos los pares", inicio)
     
     def _setup_ui(self):
         """Configura la interfaz de usuario con texto negro en botones"""
@@ -402,8 +597,12 @@ class MapaColombiaConBusqueda:
         map_frame = ttk.LabelFrame(self.main_frame, text="Mapa de Colombia", padding=10)
         map_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        self.map_frame = MapaInteractivo(map_frame, self.datos)
+        backend = os.environ.get('RUTAS_BACKEND', 'selenium')
+        rapido = os.environ.get('RUTAS_RAPIDO') == '1'
+        self.map_frame = MapaInteractivo(map_frame, self.datos, backend=backend, rapido=rapido,
+                                        ubicaciones=self.motor.ubicaciones)
         self.map_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.map_frame.al_seleccionar = self._seleccionar_en_mapa
         
         # Panel de control
         control_frame = ttk.LabelFrame(self.main_frame, text="Controles", width=350, padding=10)
@@ -435,6 +634,26 @@ class MapaColombiaConBusqueda:
         ttk.Button(btn_frame, text="Reiniciar Mapa", 
                   command=self.reiniciar_vista, style='Black.TButton').pack(fill=tk.X, pady=5)
         
+        # Cierres: actúan sobre la vía directa entre las ciudades seleccionadas
+        vias_frame = ttk.Frame(control_frame)
+        vias_frame.pack(fill=tk.X, pady=(0, 10))
+        ttk.Button(vias_frame, text="Cerrar Vía", 
+                  command=self.cerrar_via, style='Black.TButton').pack(side=tk.LEFT, expand=True, fill=tk.X)
+        ttk.Button(vias_frame, text="Reabrir Vía", 
+                  command=self.reabrir_via, style='Black.TButton').pack(side=tk.LEFT, expand=True, fill=tk.X)
+        
+        # Varias paradas desde la ciudad de origen
+        paradas_frame = ttk.LabelFrame(control_frame, text="Paradas", padding=5)
+        paradas_frame.pack(fill=tk.X, pady=(0, 10))
+        self.paradas_lista = tk.Listbox(paradas_frame, selectmode=tk.MULTIPLE, height=6, exportselection=False)
+        for ciudad in self.ciudades_ordenadas:
+            self.paradas_lista.insert(tk.END, ciudad)
+        self.paradas_lista.pack(fill=tk.X)
+        self.regreso = tk.BooleanVar(value=False)
+        ttk.Checkbutton(paradas_frame, text="Regresar al origen", variable=self.regreso).pack(anchor=tk.W, pady=2)
+        ttk.Button(paradas_frame, text="Ruta con Paradas", 
+                  command=self.busqueda_paradas, style='Black.TButton').pack(fill=tk.X, pady=2)
+        
         # Panel de información
         info_frame = ttk.LabelFrame(control_frame, text="Resultados", padding=10)
         info_frame.pack(fill=tk.BOTH, expand=True)
@@ -443,55 +662,32 @@ class MapaColombiaConBusqueda:
                                   wraplength=300, justify=tk.LEFT, font=('Arial', 10))
         self.info_label.pack(fill=tk.BOTH, expand=True)
     
-    def _precompute_grafo(self):
-        """Precomputa el grafo para búsquedas rápidas"""
-        self.grafo = {}
-        for ciudad, conexiones in self.datos['conexiones'].items():
-            self.grafo[ciudad] = list(conexiones.items())
-    
-    def distancia_heuristic(self, ciudad1, ciudad2):
-        """Distancia heurística con caché"""
-        cache_key = (ciudad1, ciudad2)
-        if cache_key not in self.heuristic_cache:
-            lat1, lon1 = coordenadas[ciudad1]
-            lat2, lon2 = coordenadas[ciudad2]
-            self.heuristic_cache[cache_key] = math.sqrt((lat2-lat1)**2 + (lon2-lon1)**2) * 100
-        return self.heuristic_cache[cache_key]
+    def _seleccionar_en_mapa(self, lat, lon, boton):
+        """Ajusta origen (clic izquierdo) o destino (clic derecho) a la ciudad más cercana al clic"""
+        ciudad = self.motor.ciudad_mas_cercana(lat, lon)
+        if ciudad is None:
+            return
+        selector, rol = (self.ciudad_inicial, "Origen") if boton == 1 else (self.ciudad_destino, "Destino")
+        selector.set(ciudad)
+        self.info_label.config(text=f"{rol}: {ciudad} ({lat:.3f}, {lon:.3f})")
     
     def busqueda_voraz(self):
-        """Búsqueda voraz optimizada"""
-        inicio = self.ciudad_inicial.get()
-        destino = self.ciudad_destino.get()
-        
-        if not inicio or not destino:
-            self.info_label.config(text="Seleccione ambas ciudades")
-            return
-        
-        start_time = time.time()
-        
-        cola = PriorityQueue()
-        cola.put((0, inicio, [inicio], 0))
-        visitados = set()
-        
-        while not cola.empty():
-            _, actual, ruta, distancia = cola.get()
-            
-            if actual == destino:
-                self._mostrar_resultado(ruta, distancia, "Voraz", start_time)
-                return
-            
-            if actual not in visitados:
-                visitados.add(actual)
-                
-                for vecino, dist in self.grafo.get(actual, []):
-                    if vecino not in visitados:
-                        heuristica = self.distancia_heuristic(vecino, destino)
-                        cola.put((heuristica, vecino, ruta + [vecino], distancia + dist))
-        
-        self.info_label.config(text="No se encontró ruta")
+        """Búsqueda voraz sobre el motor de rutas"""
+        self._buscar('voraz', "Voraz")
     
     def busqueda_a_estrella(self):
-        """Búsqueda A* optimizada"""
+        """Ruta óptima: desde la tabla de todos los pares si ya está cargada, si no con A*"""
+        if 'tabla' in self.motor.algoritmos:
+            self._buscar('a_estrella', "A*, tabla precalculada", motor_algoritmo='tabla')
+        else:
+            self._buscar('a_estrella', "A*")
+    
+    def _buscar(self, algoritmo, etiqueta, motor_algoritmo=None):
+        """Lee los selectores, consulta el motor y muestra el resultado.
+        
+        ``motor_algoritmo`` responde la consulta con otro algoritmo del motor que
+        da la misma ruta; la caché sigue usando ``algoritmo`` en la clave.
+        """
         inicio = self.ciudad_inicial.get()
         destino = self.ciudad_destino.get()
         
@@ -499,46 +695,141 @@ class MapaColombiaConBusqueda:
             self.info_label.config(text="Seleccione ambas ciudades")
             return
         
-        start_time = time.time()
+        motor_algoritmo = motor_algoritmo or algoritmo
+        metricas = Metricas('ruta', origen=inicio, destino=destino, algoritmo=motor_algoritmo,
+                            backend=self.map_frame.backend)
+        clave = (self.map_frame.backend, algoritmo, inicio, destino)
+        with metricas.fase('caché'):
+            entrada = self.cache.obtener(clave)
+        if entrada is not None:
+            resultado, imagen = entrada
+            metricas.contar('acierto de caché')
+            self._mostrar_resultado(resultado.ruta, resultado.distancia, etiqueta, metricas, imagen,
+                                    expandidos=resultado.expandidos)
+            return
+        
+        resultado = self.motor.ruta(inicio, destino, motor_algoritmo, metricas)
         
-        cola = PriorityQueue()
-        cola.put((0, inicio, [inicio], 0))
-        visitados = set()
+        if resultado is None:
+            self.map_frame.cancelar_render()
+            self.info_label.config(text=f"No se encontró ruta\n{metricas.resumen()}")
+            metricas.exportar()
+            return
         
-        while not cola.empty():
-            _, actual, ruta, costo_real = cola.get()
-            
-            if actual == destino:
-                self._mostrar_resultado(ruta, costo_real, "A*", start_time)
-                return
-            
-            if actual not in visitados:
-                visitados.add(actual)
-                
-                for vecino, dist in self.grafo.get(actual, []):
-                    if vecino not in visitados:
-                        nuevo_costo = costo_real + dist
-                        heuristica = self.distancia_heuristic(vecino, destino)
-                        cola.put((
-                            nuevo_costo + heuristica,
-                            vecino,
-                            ruta + [vecino],
-                            nuevo_costo
-                        ))
-        
-        self.info_label.config(text="No se encontró ruta")
-    
-    def _mostrar_resultado(self, ruta, distancia, algoritmo, start_time):
-        """Muestra los resultados con formato mejorado"""
-        elapsed = time.time() - start_time
-        self.map_frame.mostrar_ruta(ruta)
+        self._mostrar_resultado(
+            resultado.ruta, resultado.distancia, etiqueta, metricas,
+            al_renderizar=lambda imagen: self.cache.guardar(clave, resultado, imagen),
+            expandidos=resultado.expandidos
+        )
+    
+    def _mostrar_resultado(self, ruta, distancia, algoritmo, metricas, imagen=None, al_renderizar=None,
+                           expandidos=0):
+        """Muestra los resultados; el mapa se renderiza en segundo plano salvo que ``imagen`` venga de la caché.
         
+        El panel se actualiza de nuevo con los tiempos del render cuando este termina.
+        """
         info_text = (
             f"⚡ Ruta encontrada ({algoritmo})\n"
             f"📍 {' → '.join(ruta)}\n"
             f"📏 Distancia: {distancia:.1f} km\n"
+            f"🔎 Nodos expandidos: {expandidos}\n"
+            f"🗂 {self.cache.estadisticas()}\n"
+        )
+        
+        def actualizar_panel():
+            self.info_label.config(text=info_text + metricas.resumen(), font=('Arial', 10))
+        
+        def terminar(img):
+            if al_renderizar is not None:
+                al_renderizar(img)
+            actualizar_panel()
+            metricas.exportar()
+        
+        if imagen is None:
+            self.map_frame.solicitar_ruta(ruta, terminar, metricas)
+            actualizar_panel()
+        else:
+            with metricas.fase('mostrar'):
+                self.map_frame.mostrar_ruta_cacheada(imagen, ruta)
+            actualizar_panel()
+            metricas.exportar()
+    
+    def busqueda_paradas(self):
+        """Mejor orden para visitar las paradas seleccionadas desde el origen, dibujado como una sola ruta"""
+        from paradas import optimizar
+        
+        origen = self.ciudad_inicial.get()
+        paradas = [self.paradas_lista.get(i) for i in self.paradas_lista.curselection()]
+        if not origen or not [p for p in paradas if p != origen]:
+            self.info_label.config(text="Seleccione el origen y al menos una parada")
+            return
+        
+        metricas = Metricas('paradas', origen=origen, paradas=paradas, regreso=self.regreso.get(),
+                            backend=self.map_frame.backend)
+        regreso = self.regreso.get()
+        
+        def terminar(resultado, img):
+            if resultado is None:
+                self.info_label.config(text=f"Alguna parada es inalcanzable\n{metricas.resumen()}")
+            else:
+                self.info_label.config(text=(
+                    f"🚚 Ruta con {len(resultado.tramos)} tramos (orden {resultado.metodo})\n"
+                    f"🛑 {' → '.join(resultado.orden)}\n"
+                    f"📍 {' → '.join(resultado.ruta)}\n"
+                    f"📏 Distancia: {resultado.distancia:.1f} km\n"
+                    f"{metricas.resumen()}"
+                ), font=('Arial', 10))
+            metricas.exportar()
+        
+        # El orden (con su presupuesto de tiempo) se calcula en el hilo de render, no en el de Tk
+        self.map_frame.solicitar_calculo(
+            lambda: optimizar(self.motor, origen, paradas, regreso, PRESUPUESTO_PARADAS_S, metricas),
+            terminar, metricas
         )
-        self.info_label.config(text=info_text, font=('Arial', 10))
+        self.info_label.config(text=f"Ordenando {len(paradas)} paradas…")
+    
+    def cerrar_via(self):
+        """Cierra la vía directa entre origen y destino"""
+        self._cambiar_via(self.motor.cerrar_via, "cerrada")
+    
+    def reabrir_via(self):
+        """Reabre la vía directa entre origen y destino"""
+        self._cambiar_via(self.motor.reabrir_via, "reabierta")
+    
+    def _cambiar_via(self, cambiar, accion):
+        """Aplica el cambio en el motor, invalida solo las rutas afectadas y redibuja el mapa"""
+        inicio = self.ciudad_inicial.get()
+        destino = self.ciudad_destino.get()
+        if not inicio or not destino:
+            self.info_label.config(text="Seleccione las dos ciudades de la vía")
+            return
+        try:
+            cambios = cambiar(inicio, destino)
+        except ValueError as error:
+            self.info_label.config(text=str(error))
+            return
+        descartadas = self.cache.invalidar(self._entrada_afectada(cambios), huella=self.motor.huella_vigente)
+        cerradas = {(origen, fin) for origen, fin, _, peso in self.motor.vias_modificadas() if math.isinf(peso)}
+        self.map_frame.marcar_cerradas(cerradas)
+        self.info_label.config(text=f"Vía {inicio} - {destino} {accion}\n"
+                                    f"🗂 {descartadas} rutas en caché invalidadas")
+    
+    def _entrada_afectada(self, cambios):
+        """Predicado para ``CacheRutas.invalidar``: la ruta cambió o su imagen muestra una vía que cambió de estado"""
+        nombres = self.motor.grafo.nombres
+        ubicaciones = self.map_frame.ubicaciones
+        tramos = [(ubicaciones[nombres[c.origen]], ubicaciones[nombres[c.destino]]) for c in cambios
+                  if math.isinf(c.anterior) != math.isinf(c.nuevo)
+                  and nombres[c.origen] in ubicaciones and nombres[c.destino] in ubicaciones]
+        
+        def afectada(clave, resultado, imagen):
+            if self.motor.ruta_afectada(resultado, cambios):
+                return True
+            (sur, oeste), (norte, este) = self.map_frame._limites_de_ruta(resultado.ruta)
+            return any(min(a[0], b[0]) <= norte and max(a[0], b[0]) >= sur
+                       and min(a[1], b[1]) <= este and max(a[1], b[1]) >= oeste for a, b in tramos)
+        
+        return afectada
     
     def reiniciar_vista(self):
         """Reinicia la vista inicial"""
@@ -546,6 +837,8 @@ class MapaColombiaConBusqueda:
         self.info_label.config(text="Mapa reiniciado. Seleccione ciudades y algoritmo.")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    _registrar_fase("importaciones", _T0)
     root = tk.Tk()
     app = MapaColombiaConBusqueda(root)
     root.mainloop()
\ No newline at end of file
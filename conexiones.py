@@ -1,43 +1,108 @@
-import pandas as pd
+import argparse
+import hashlib
 import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from formato_grafo import ruta_grafo_por_defecto
+from motor_rutas import MotorRutas
+
+# Uso: python conexiones.py [--excel departamentos_colombia.xlsx] [--salida conexiones_colombia_final.json] [--forzar]
+#
+# Lee la matriz de distancias entre capitales como un solo bloque NumPy y
+# genera el JSON de conexiones y su grafo binario. Si la huella del Excel no cambió desde la
+# última ejecución, no regenera nada.
+
+def huella_archivo(ruta):
+    """SHA-256 del contenido de un archivo"""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+def leer_matriz(ruta_excel, hoja='Lista Departamentos'):
+    """Devuelve (nombres de capitales, matriz n×n de distancias con 0 donde no hay conexión)"""
+    df = pd.read_excel(ruta_excel, sheet_name=hoja, header=None)
+
+    # La fila de encabezado es la que tiene 'Capital' en la columna D (fila 3 del Excel)
+    fila_encabezado = df.index[df.iloc[:, 3].astype(str).str.strip() == 'Capital'][0]
+    encabezado = df.iloc[fila_encabezado, 4:]
+    nombres = encabezado[encabezado.notna()].astype(str).str.strip().tolist()
+    n = len(nombres)
+
+    datos = df.iloc[fila_encabezado + 1:]
+    datos = datos[datos.iloc[:, 2].notna()]  # Filas con departamento
+    capitales = datos.iloc[:, 3].astype(str).str.strip()
+    if sorted(capitales) != sorted(nombres):
+        raise ValueError("Las capitales de las filas no coinciden con las del encabezado")
+
+    bloque = datos.iloc[:, 4:4 + n].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    # Reordenar las filas según el orden de las columnas
+    orden = pd.Index(capitales).get_indexer(nombres)
+    matriz = bloque[orden]
+
+    # Enmascarar NaN, ceros y diagonal de una vez
+    matriz = np.where(np.isfinite(matriz) & (matriz > 0), matriz, 0.0)
+    np.fill_diagonal(matriz, 0.0)
+    return nombres, matriz
+
+def simetrizar(nombres, matriz):
+    """Completa las conexiones dadas en un solo sentido; falla si los dos sentidos difieren"""
+    transpuesta = matriz.T
+    conflicto = (matriz > 0) & (transpuesta > 0) & (matriz != transpuesta)
+    if conflicto.any():
+        i, j = np.argwhere(conflicto)[0]
+        raise ValueError(
+            f"Distancia asimétrica entre {nombres[i]} y {nombres[j]}: "
+            f"{matriz[i, j]} vs {matriz[j, i]}"
+        )
+    un_sentido = (matriz == 0) & (transpuesta > 0)
+    if un_sentido.any():
+        print(f"Aviso: {int(un_sentido.sum())} conexiones solo aparecen en un sentido; se completan")
+    return np.where(matriz > 0, matriz, transpuesta)
+
+def a_conexiones(nombres, matriz):
+    """Estructura de ``conexiones.json`` a partir de la matriz simétrica"""
+    conexiones = {}
+    for i, capital in enumerate(nombres):
+        columnas = np.flatnonzero(matriz[i])
+        conexiones[capital] = {nombres[j]: float(matriz[i, j]) for j in columnas}
+    return {'capitales': nombres, 'conexiones': conexiones}
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera el JSON de conexiones desde el Excel de capitales")
+    parser.add_argument('--excel', default='departamentos_colombia.xlsx')
+    parser.add_argument('--salida', default='conexiones_colombia_final.json')
+    parser.add_argument('--forzar', action='store_true', help="Regenerar aunque el Excel no haya cambiado")
+    args = parser.parse_args()
+
+    # La huella del Excel usado se guarda junto a la salida
+    archivo_huella = args.salida + '.sha256'
+    huella = huella_archivo(args.excel)
+    ruta_grafo = ruta_grafo_por_defecto(args.salida)
+    if not args.forzar and all(map(os.path.exists, (args.salida, archivo_huella, ruta_grafo))):
+        with open(archivo_huella, 'r', encoding='utf-8') as f:
+            if f.read().strip() == huella:
+                print(f"Sin cambios en '{args.excel}': se conserva '{args.salida}'")
+                return
+
+    nombres, matriz = leer_matriz(args.excel)
+    conexiones_colombia = a_conexiones(nombres, simetrizar(nombres, matriz))
+
+    # Guardar en JSON con formato correcto
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(conexiones_colombia, f, indent=2, ensure_ascii=False)
+    with open(archivo_huella, 'w', encoding='utf-8') as f:
+        f.write(huella + '\n')
+
+    # Grafo binario para cargas en frío rápidas
+    MotorRutas(args.salida, usar_binario=False).guardar_binario(ruta_grafo)
+
+    print(f"Archivo JSON generado correctamente: '{args.salida}'")
+    print(f"Grafo binario generado correctamente: '{ruta_grafo}'")
 
-# Leer el archivo Excel correctamente
-df = pd.read_excel('departamentos_colombia.xlsx', 
-                  sheet_name='Lista Departamentos',
-                  header=2)  # Saltamos las 2 primeras filas de encabezado
-
-# Obtener los nombres reales de las capitales (de la fila 3 del Excel)
-nombres_capitales = [
-    'Leticia', 'Medellín', 'Arauca', 'Barranquilla', 'Cartagena de Indias',
-    'Tunja', 'Manizales', 'Florencia', 'Yopal', 'Popayán', 'Valledupar',
-    'Quibdó', 'Montería', 'Bogotá', 'Inírida', 'San José del Guaviare',
-    'Neiva', 'Riohacha', 'Santa Marta', 'Villavicencio', 'Pasto',
-    'San José de Cúcuta', 'Mocoa', 'Armenia', 'Pereira', 'San Andrés',
-    'Bucaramanga', 'Sincelejo', 'Ibagué', 'Cali', 'Mitú', 'Puerto Carreño'
-]
-
-# Crear estructura de datos corregida
-conexiones_colombia = {
-    'capitales': nombres_capitales,
-    'conexiones': {}
-}
-
-# Mapeo de índices de columnas a nombres de capitales
-columna_a_capital = {i+4: nombre for i, nombre in enumerate(nombres_capitales)}
-
-# Procesar cada fila correctamente
-for _, row in df.iterrows():
-    if pd.notna(row.iloc[2]):  # Verificar que la fila tenga datos de departamento
-        capital = row.iloc[3]  # Columna 'Capital'
-        conexiones_colombia['conexiones'][capital] = {}
-        
-        for col_idx, ciudad_conexion in columna_a_capital.items():
-            distancia = row.iloc[col_idx]
-            if pd.notna(distancia) and distancia != 0 and ciudad_conexion != capital:
-                conexiones_colombia['conexiones'][capital][ciudad_conexion] = distancia
-
-# Guardar en JSON con formato correcto
-with open('conexiones_colombia_final.json', 'w', encoding='utf-8') as f:
-    json.dump(conexiones_colombia, f, indent=2, ensure_ascii=False)
-
-print("Archivo JSON generado correctamente: 'conexiones_colombia_final.json'")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Formato binario versionado del grafo para cargas en frío sin parsear JSON.
+
+Secciones, alineadas a 64 bytes y en little-endian:
+
+- tabla de nombres (UTF-8 separados por ``\\n``; las primeras ``n_capitales`` son capitales)
+- latitudes y longitudes ``float64[n]``
+- CSR: offsets ``int64[n + 1]``, destinos ``int32[m]``, pesos ``float64[m]``
+
+La cabecera guarda la huella SHA-256, el tamaño y la fecha de modificación
+del JSON de origen; si no coinciden, el binario se considera viejo.
+Al cargar, el archivo se mapea en memoria y los arreglos son vistas NumPy
+sobre el mapeo, sin copias.
+
+``FormatoSecciones`` y ``cargar_o_construir`` son la base común de los otros
+archivos derivados (``.tabla``, ``.hitos``, ``.jerarquia``): misma cabecera
+con magia y versión, mismas secciones alineadas, misma escritura atómica.
+
+Uso: ``python formato_grafo.py [conexiones.json]``
+"""
+import hashlib
+import os
+import struct
+import sys
+
+import numpy as np
+
+_ALINEACION = 64
+
+def _alinear(posicion):
+    return (posicion + _ALINEACION - 1) // _ALINEACION * _ALINEACION
+
+class FormatoSecciones:
+    """Archivo con una cabecera ``struct`` (magia, versión y ``campos``) y arreglos en secciones alineadas.
+
+    Las secciones se describen como ``[(nombre, dtype, forma), ...]`` en el
+    orden en que van en el archivo; escritura y lectura usan la misma lista.
+    """
+
+    def __init__(self, magia, version, campos, descripcion):
+        self.magia = magia
+        self.version = version
+        self.cabecera = struct.Struct('<8sI' + campos)
+        self.descripcion = descripcion
+
+    def disposicion(self, secciones):
+        """Desplazamiento de cada sección y tamaño total del archivo"""
+        posiciones = {}
+        posicion = self.cabecera.size
+        for nombre, dtype, forma in secciones:
+            posicion = _alinear(posicion)
+            posiciones[nombre] = posicion
+            posicion += int(np.prod(forma, dtype=np.int64)) * np.dtype(dtype).itemsize
+        return posiciones, posicion
+
+    def escribir(self, ruta, campos, secciones, arreglos):
+        """Escribe de forma atómica (archivo temporal + ``os.replace``)"""
+        posiciones, total = self.disposicion(secciones)
+        temporal = ruta + '.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(self.cabecera.pack(self.magia, self.version, *campos))
+            for nombre, dtype, _ in secciones:
+                f.seek(posiciones[nombre])
+                f.write(np.ascontiguousarray(arreglos[nombre], dtype=dtype).tobytes())
+            f.truncate(total)
+        os.replace(temporal, ruta)
+
+    def leer_cabecera(self, ruta):
+        """Campos de la cabecera tras la magia y la versión; ``ValueError`` si no son las de este formato"""
+        with open(ruta, 'rb') as f:
+            magia, version, *campos = self.cabecera.unpack(f.read(self.cabecera.size))
+        if magia != self.magia or version != self.version:
+            raise ValueError(f"Archivo de {self.descripcion} no válido o de otra versión: {ruta}")
+        return campos
+
+    def mapear(self, ruta, secciones):
+        """``{nombre: arreglo}`` como vistas de solo lectura sobre el archivo mapeado en memoria"""
+        posiciones, total = self.disposicion(secciones)
+        buffer = np.memmap(ruta, dtype=np.uint8, mode='r', shape=(total,))
+        vistas = {}
+        for nombre, dtype, forma in secciones:
+            inicio = posiciones[nombre]
+            fin = inicio + int(np.prod(forma, dtype=np.int64)) * np.dtype(dtype).itemsize
+            vistas[nombre] = buffer[inicio:fin].view(dtype).reshape(forma)
+        return vistas
+
+def cargar_o_construir(ruta, abrir, vigente, guardar):
+    """``abrir(ruta)`` si el archivo existe y ``vigente`` lo acepta; si no, ``guardar(ruta)`` y se abre de nuevo"""
+    try:
+        contenido = abrir(ruta)
+        if vigente(contenido):
+            return contenido
+    except (OSError, ValueError, struct.error):
+        pass
+    guardar(ruta)
+    return abrir(ruta)
+
+# n, n_capitales, m, bytes de nombres, huella, tamaño JSON, mtime JSON (ns)
+FORMATO = FormatoSecciones(b'RUTASGR1', 1, 'IIQQ32sQq', 'grafo')
+
+def ruta_grafo_por_defecto(ruta_json):
+    """``conexiones.json`` -> ``conexiones.grafo``"""
+    return os.path.splitext(ruta_json)[0] + '.grafo'
+
+def _secciones(n, m, bytes_nombres):
+    return [('nombres', np.uint8, (bytes_nombres,)), ('latitudes', '<f8', (n,)), ('longitudes', '<f8', (n,)),
+            ('offsets', '<i8', (n + 1,)), ('destinos', '<i4', (m,)), ('pesos', '<f8', (m,))]
+
+def escribir_grafo(ruta_grafo, grafo, latitudes, longitudes, n_capitales, ruta_json):
+    """Escribe el grafo, sellado con la huella de ``ruta_json``"""
+    with open(ruta_json, 'rb') as f:
+        huella = hashlib.sha256(f.read()).digest()
+    estado = os.stat(ruta_json)
+
+    nombres = '\n'.join(grafo.nombres).encode('utf-8')
+    arreglos = {
+        'nombres': np.frombuffer(nombres, dtype=np.uint8),
+        'latitudes': latitudes,
+        'longitudes': longitudes,
+        'offsets': grafo.offsets,
+        'destinos': grafo.destinos,
+        'pesos': grafo.pesos,
+    }
+    FORMATO.escribir(ruta_grafo, (grafo.n, n_capitales, grafo.m, len(nombres), huella, estado.st_size,
+                                  estado.st_mtime_ns), _secciones(grafo.n, grafo.m, len(nombres)), arreglos)
+
+class GrafoBinario:
+    """Contenido de un archivo ``.grafo`` como vistas NumPy sobre un mapeo de memoria"""
+
+    def __init__(self, ruta_grafo):
+        n, n_capitales, m, bytes_nombres, huella, tamano_json, mtime_json = FORMATO.leer_cabecera(ruta_grafo)
+        self.n = n
+        self.n_capitales = n_capitales
+        self.huella = huella.hex()
+        self.tamano_json = tamano_json
+        self.mtime_json = mtime_json
+
+        vistas = FORMATO.mapear(ruta_grafo, _secciones(n, m, bytes_nombres))
+        self.nombres = bytes(vistas['nombres']).decode('utf-8').split('\n') if n else []
+        self.latitudes = vistas['latitudes']
+        self.longitudes = vistas['longitudes']
+        self.offsets = vistas['offsets']
+        self.destinos = vistas['destinos']
+        self.pesos = vistas['pesos']
+
+    def vigente_para(self, ruta_json):
+        """``True`` si el binario corresponde al JSON actual (o si el JSON no existe)"""
+        try:
+            estado = os.stat(ruta_json)
+        except FileNotFoundError:
+            return True
+        if estado.st_size == self.tamano_json and estado.st_mtime_ns == self.mtime_json:
+            return True
+        # Tras un checkout la fecha cambia aunque el contenido sea el mismo: se compara la huella
+        with open(ruta_json, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest() == self.huella
+
+def cargar_si_vigente(ruta_grafo, ruta_json):
+    """``GrafoBinario`` si el archivo existe y no está viejo; ``None`` en otro caso"""
+    try:
+        binario = GrafoBinario(ruta_grafo)
+    except (OSError, ValueError, struct.error):
+        return None
+    return binario if binario.vigente_para(ruta_json) else None
+
+if __name__ == '__main__':
+    from motor_rutas import MotorRutas
+
+    ruta_json = sys.argv[1] if len(sys.argv) > 1 else 'conexiones.json'
+    motor = MotorRutas(ruta_json, usar_binario=False)
+    ruta_grafo = ruta_grafo_por_defecto(ruta_json)
+    motor.guardar_binario(ruta_grafo)
+    print(f"Grafo binario generado: '{ruta_grafo}' ({motor.grafo.n} nodos, {motor.grafo.m} aristas)")
@@ -0,0 +1,176 @@
+"""Hitos (landmarks) para A* con la desigualdad triangular (ALT).
+
+Se eligen ``k`` hitos por selección del más lejano y se guardan, para cada
+hito ``L``, las distancias ``d(L, v)`` y ``d(v, L)`` a todos los nodos. Por
+la desigualdad triangular, ``d(v, t) >= max(d(L, t) - d(L, v), d(v, L) - d(t, L))``;
+el máximo sobre los hitos es una cota inferior mucho más ajustada que el gran
+círculo cuando las vías rodean montañas o selvas.
+
+El archivo ``.hitos`` se mapea en memoria y se recalcula solo cuando cambia
+la huella de ``conexiones.json`` o el número de hitos.
+
+Uso: ``python hitos.py [conexiones.json] [-k 16] [--comparar 200] [--sintetico 20000]``
+"""
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+from formato_grafo import FormatoSecciones, cargar_o_construir
+from motor_rutas import distancias_desde
+
+# n, k, huella sha256 (32 bytes); la versión 2 alinea también la sección de ids
+FORMATO = FormatoSecciones(b'RUTASHT1', 2, 'II32s', 'hitos')
+HITOS_POR_DEFECTO = 16
+
+def _secciones(n, k):
+    return [('ids', '<i4', (k,)), ('desde', '<f8', (k, n)), ('hacia', '<f8', (k, n))]
+
+def ruta_hitos_por_defecto(ruta_json):
+    """``conexiones.json`` -> ``conexiones.hitos``"""
+    return os.path.splitext(ruta_json)[0] + '.hitos'
+
+def calcular_hitos(grafo, k=HITOS_POR_DEFECTO, semilla=0):
+    """Elige ``k`` hitos por selección del más lejano; devuelve (ids, desde, hacia)"""
+    k = min(k, grafo.n)
+    invertido = grafo.invertido
+    ids, desde, hacia = [], [], []
+    # El primer hito es el nodo más lejano a uno elegido al azar; cada siguiente,
+    # el más lejano de todos los hitos ya elegidos (sin contar los inalcanzables)
+    minima = distancias_desde(grafo, int(np.random.default_rng(semilla).integers(grafo.n)))
+    for _ in range(k):
+        lejania = np.where(np.isfinite(minima), minima, -1.0)
+        hito = int(np.argmax(lejania))
+        if ids and lejania[hito] <= 0:
+            break  # Todos los nodos alcanzables ya son hitos
+        ids.append(hito)
+        desde.append(distancias_desde(grafo, hito))
+        hacia.append(distancias_desde(invertido, hito))
+        minima = desde[-1] if len(ids) == 1 else np.minimum(minima, desde[-1])
+    return np.array(ids, dtype=np.int32), np.array(desde), np.array(hacia)
+
+def guardar_hitos(ruta_hitos, huella, ids, desde, hacia):
+    k, n = desde.shape
+    FORMATO.escribir(ruta_hitos, (n, k, bytes.fromhex(huella)), _secciones(n, k),
+                     {'ids': ids, 'desde': desde, 'hacia': hacia})
+
+class Hitos:
+    """Distancias desde y hacia cada hito, y las cotas inferiores que se derivan de ellas"""
+
+    def __init__(self, ids, desde, hacia, huella=None):
+        self.ids = ids
+        self.desde = desde
+        self.hacia = hacia
+        self.huella = huella
+        self.k, self.n = desde.shape
+
+    @classmethod
+    def abrir(cls, ruta_hitos):
+        """Vista de solo lectura, mapeada en memoria, sobre un archivo ``.hitos``"""
+        n, k, huella = FORMATO.leer_cabecera(ruta_hitos)
+        vistas = FORMATO.mapear(ruta_hitos, _secciones(n, k))
+        return cls(vistas['ids'], vistas['desde'], vistas['hacia'], huella.hex())
+
+    @classmethod
+    def cargar_o_construir(cls, grafo, huella, ruta_hitos, k=HITOS_POR_DEFECTO):
+        """Abre los hitos; los recalcula si faltan o no coinciden con ``huella`` y ``k``"""
+        return cargar_o_construir(
+            ruta_hitos, cls.abrir,
+            lambda hitos: hitos.huella == huella and hitos.n == grafo.n and hitos.k == min(k, grafo.n),
+            lambda ruta: guardar_hitos(ruta, huella, *calcular_hitos(grafo, k)))
+
+    def reparar(self, grafo, aristas):
+        """Recalcula los hitos cuyas distancias dejaron de servir tras abaratar ``aristas``.
+
+        Las distancias guardadas dan cotas admisibles y consistentes mientras
+        ``desde[v] <= desde[u] + w(u, v)`` y ``hacia[u] <= w(u, v) + hacia[v]``
+        en cada arista ``(u, v, w)``; encarecer o cerrar una vía nunca rompe
+        esa condición. ``grafo`` ya tiene los pesos nuevos. Devuelve los
+        índices de los hitos recalculados.
+        """
+        if not aristas:
+            return []
+        u, v, w = (np.array(columna) for columna in zip(*aristas))
+        u, v = u.astype(np.int64), v.astype(np.int64)
+        with np.errstate(invalid='ignore'):
+            rotos = ((self.desde[:, v] > self.desde[:, u] + w + 1e-9).any(axis=1)
+                     | (self.hacia[:, u] > w + self.hacia[:, v] + 1e-9).any(axis=1))
+        indices = np.flatnonzero(rotos).tolist()
+        if indices and not self.desde.flags.writeable:
+            self.desde = np.array(self.desde)
+            self.hacia = np.array(self.hacia)
+        for r in indices:
+            self.desde[r] = distancias_desde(grafo, int(self.ids[r]))
+            self.hacia[r] = distancias_desde(grafo.invertido, int(self.ids[r]))
+        return indices
+
+    def cota_hacia(self, meta):
+        """Función ``v -> cota inferior de d(v, meta)``, para evaluarla solo en los nodos visitados"""
+        desde, hacia = self.desde, self.hacia
+        desde_meta, hacia_meta = desde[:, meta].tolist(), hacia[:, meta].tolist()
+        return lambda v: _mayor_diferencia(desde_meta, desde[:, v].tolist(), hacia[:, v].tolist(), hacia_meta)
+
+    def cota_desde(self, inicio):
+        """Función ``v -> cota inferior de d(inicio, v)``"""
+        desde, hacia = self.desde, self.hacia
+        desde_inicio, hacia_inicio = desde[:, inicio].tolist(), hacia[:, inicio].tolist()
+        return lambda v: _mayor_diferencia(desde[:, v].tolist(), desde_inicio, hacia_inicio, hacia[:, v].tolist())
+
+def _mayor_diferencia(a, b, c, d):
+    """``max(0, a[l] - b[l], c[l] - d[l])`` sobre los hitos ``l``"""
+    # Un hito que no alcanza a ambos nodos no dice nada útil: su término (inf o NaN) no cuenta
+    mejor = 0.0
+    for a_l, b_l, c_l, d_l in zip(a, b, c, d):
+        termino = a_l - b_l
+        if mejor < termino < math.inf:
+            mejor = termino
+        termino = c_l - d_l
+        if mejor < termino < math.inf:
+            mejor = termino
+    return mejor
+
+def comparar(motor, pares, algoritmos=('a_estrella', 'bidireccional', 'alt', 'alt_bidireccional')):
+    """Nodos expandidos y tiempo medio por algoritmo sobre los mismos pares"""
+    referencia = {}
+    for algoritmo in algoritmos:
+        expandidos, inicio = 0, time.perf_counter()
+        for origen, destino in pares:
+            resultado = motor.ruta(origen, destino, algoritmo)
+            if resultado is None:
+                continue
+            expandidos += resultado.expandidos
+            esperado = referencia.setdefault((origen, destino), resultado.distancia)
+            if abs(resultado.distancia - esperado) > 1e-6 * max(1.0, esperado):
+                raise AssertionError(f"{algoritmo} da {resultado.distancia} en {origen} -> {destino}; se esperaba {esperado}")
+        ms = (time.perf_counter() - inicio) / len(pares) * 1000
+        print(f"{algoritmo:>18}: {expandidos / len(pares):10.1f} nodos expandidos, {ms:8.2f} ms por consulta")
+
+if __name__ == '__main__':
+    from motor_rutas import MotorRutas
+
+    parser = argparse.ArgumentParser(description="Calcula los hitos ALT y compara el trabajo de cada búsqueda")
+    parser.add_argument('json', nargs='?', default='conexiones.json')
+    parser.add_argument('-k', type=int, default=HITOS_POR_DEFECTO, help="Número de hitos")
+    parser.add_argument('--comparar', type=int, default=0, metavar='PARES',
+                        help="Comparar algoritmos sobre este número de pares al azar")
+    parser.add_argument('--sintetico', type=int, default=0, metavar='NODOS',
+                        help="Usar un grafo sintético de este tamaño en lugar del JSON")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.sintetico:
+        from grafo_sintetico import generar_grafo
+
+        motor = generar_grafo(args.sintetico)
+    else:
+        motor = MotorRutas(args.json)
+    hitos = motor.cargar_hitos(k=args.k)
+    print(f"{hitos.k} hitos listos en {time.perf_counter() - inicio:.2f} s ({motor.grafo.n} nodos)")
+
+    if args.comparar:
+        rng = np.random.default_rng(0)
+        nombres = motor.grafo.nombres
+        pares = [(nombres[i], nombres[j]) for i, j in rng.integers(motor.grafo.n, size=(args.comparar, 2))]
+        comparar(motor, pares)
@@ -0,0 +1,104 @@
+"""Índice espacial de grilla uniforme para encontrar el nodo más cercano a un punto.
+
+Los puntos se proyectan a un plano equirectangular centrado en su latitud
+media (x = lon·cos(lat0), y = lat) y se agrupan por celda en orden CSR. Una
+consulta recorre anillos de celdas alrededor del punto y se detiene cuando
+ningún punto de la parte de la grilla aún sin visitar puede estar más cerca;
+con celdas de ~2 puntos el costo esperado no depende del tamaño del grafo, y
+un punto fuera de la grilla no obliga a recorrerla entera.
+"""
+import math
+
+import numpy as np
+
+class IndiceGrilla:
+    def __init__(self, latitudes, longitudes, puntos_por_celda=2.0):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        validos = np.flatnonzero(np.isfinite(latitudes) & np.isfinite(longitudes))
+        self.vacio = len(validos) == 0
+        if self.vacio:
+            return
+
+        self._escala_x = math.cos(math.radians(float(latitudes[validos].mean())))
+        x = longitudes[validos] * self._escala_x
+        y = latitudes[validos]
+        self._x0, self._y0 = float(x.min()), float(y.min())
+        ancho = max(float(x.max()) - self._x0, 1e-9)
+        alto = max(float(y.max()) - self._y0, 1e-9)
+        # Con todos los puntos sobre una línea el área es casi nula: la celda se
+        # acota por la densidad a lo largo del lado mayor
+        self.celda = max(math.sqrt(ancho * alto * puntos_por_celda / len(validos)),
+                         max(ancho, alto) * puntos_por_celda / len(validos), 1e-6)
+        self.nx = int(ancho // self.celda) + 1
+        self.ny = int(alto // self.celda) + 1
+
+        cx = np.minimum(((x - self._x0) // self.celda).astype(np.int64), self.nx - 1)
+        cy = np.minimum(((y - self._y0) // self.celda).astype(np.int64), self.ny - 1)
+        claves = cy * self.nx + cx
+        orden = np.argsort(claves, kind='stable')
+        self._ids = validos[orden]
+        self._x = x[orden]
+        self._y = y[orden]
+        self._inicio = np.searchsorted(claves[orden], np.arange(self.nx * self.ny + 1))
+
+    def _candidatos(self, cx, cy, radio):
+        """Índices (en orden de la grilla) de los puntos en el anillo de celdas a ``radio``"""
+        partes = []
+        for fila in range(max(cy - radio, 0), min(cy + radio, self.ny - 1) + 1):
+            if abs(fila - cy) == radio:
+                columnas = range(max(cx - radio, 0), min(cx + radio, self.nx - 1) + 1)
+            else:
+                columnas = [c for c in (cx - radio, cx + radio) if 0 <= c < self.nx]
+            for columna in columnas:
+                clave = fila * self.nx + columna
+                inicio, fin = self._inicio[clave], self._inicio[clave + 1]
+                if fin > inicio:
+                    partes.append(np.arange(inicio, fin))
+        return np.concatenate(partes) if partes else None
+
+    def _cota_fuera(self, x, y, cx, cy, radio):
+        """Distancia² mínima de (x, y) a la grilla fuera del bloque visitado; ``inf`` si ya la cubre"""
+        gx1, gy1 = self._x0 + self.nx * self.celda, self._y0 + self.ny * self.celda
+        bx0 = self._x0 + max(cx - radio, 0) * self.celda
+        bx1 = self._x0 + min(cx + radio + 1, self.nx) * self.celda
+        by0 = self._y0 + max(cy - radio, 0) * self.celda
+        by1 = self._y0 + min(cy + radio + 1, self.ny) * self.celda
+        # Franjas sin visitar: a la izquierda y derecha del bloque (todo el alto), abajo y arriba (su ancho)
+        franjas = []
+        if cx - radio > 0:
+            franjas.append((self._x0, bx0, self._y0, gy1))
+        if cx + radio + 1 < self.nx:
+            franjas.append((bx1, gx1, self._y0, gy1))
+        if cy - radio > 0:
+            franjas.append((bx0, bx1, self._y0, by0))
+        if cy + radio + 1 < self.ny:
+            franjas.append((bx0, bx1, by1, gy1))
+        cota = math.inf
+        for x0, x1, y0, y1 in franjas:
+            dx = max(x0 - x, 0.0, x - x1)
+            dy = max(y0 - y, 0.0, y - y1)
+            cota = min(cota, dx * dx + dy * dy)
+        return cota
+
+    def mas_cercano(self, lat, lon):
+        """Id del punto más cercano a (lat, lon), o ``None`` si el índice está vacío"""
+        if self.vacio:
+            return None
+        x, y = lon * self._escala_x, lat
+        cx = min(max(int((x - self._x0) // self.celda), 0), self.nx - 1)
+        cy = min(max(int((y - self._y0) // self.celda), 0), self.ny - 1)
+
+        mejor, mejor_d2 = None, math.inf
+        radio = 0
+        while True:
+            candidatos = self._candidatos(cx, cy, radio)
+            if candidatos is not None:
+                d2 = (self._x[candidatos] - x) ** 2 + (self._y[candidatos] - y) ** 2
+                k = int(np.argmin(d2))
+                if d2[k] < mejor_d2:
+                    mejor, mejor_d2 = int(self._ids[candidatos[k]]), float(d2[k])
+            cota = self._cota_fuera(x, y, cx, cy, radio)
+            if math.isinf(cota) or (mejor is not None and mejor_d2 <= cota):
+                return mejor
+            radio += 1
@@ -0,0 +1,339 @@
+"""Jerarquía de contracción (CH) para consultas punto a punto en grafos grandes.
+
+Preprocesamiento: los nodos se contraen de menos a más importante (diferencia
+de aristas + vecinos ya contraídos, con actualización perezosa). Al contraer
+``v`` se agrega un atajo ``u -> w`` por cada par de vecinos cuyo camino más
+corto pasa por ``v``; una búsqueda de testigos acotada evita los atajos
+innecesarios (si se corta, el atajo se agrega igual: sobra, pero no rompe nada).
+
+Consulta: Dijkstra bidireccional que solo sube de rango en ambos sentidos;
+los atajos del camino encontrado se desempacan en la secuencia real de
+ciudades. El archivo ``.jerarquia`` se mapea en memoria y se recalcula solo
+cuando cambia la huella de ``conexiones.json``.
+
+Uso: ``python jerarquia.py [conexiones.json] [--sintetico 20000] [--verificar] [--origenes N]``
+"""
+import argparse
+import heapq
+import math
+import os
+import time
+from functools import cached_property
+
+import numpy as np
+
+from formato_grafo import FormatoSecciones, cargar_o_construir
+
+# n, aristas hacia arriba, aristas hacia abajo, huella sha256 (32 bytes)
+FORMATO = FormatoSecciones(b'RUTASCH1', 1, 'IQQ32s', 'jerarquía')
+# Nodos asentados como máximo por búsqueda de testigos
+LIMITE_TESTIGOS = 100
+
+def ruta_jerarquia_por_defecto(ruta_json):
+    """``conexiones.json`` -> ``conexiones.jerarquia``"""
+    return os.path.splitext(ruta_json)[0] + '.jerarquia'
+
+_TIPOS = {'rango': '<i4', 'offsets': '<i8', 'destinos': '<i4', 'pesos': '<f8', 'medios': '<i4'}
+
+def _tipo(nombre):
+    return np.dtype(_TIPOS[nombre.split('_')[-1]])
+
+def _secciones(n, m_arriba, m_abajo):
+    secciones = [('rango', _tipo('rango'), (n,))]
+    for prefijo, m in (('arriba', m_arriba), ('abajo', m_abajo)):
+        secciones.append((prefijo + '_offsets', _tipo('offsets'), (n + 1,)))
+        for sufijo in ('destinos', 'pesos', 'medios'):
+            secciones.append((f'{prefijo}_{sufijo}', _tipo(sufijo), (m,)))
+    return secciones
+
+def _testigos(salida, origen, evitado, objetivos, limite):
+    """Distancias desde ``origen`` sin pasar por ``evitado``, cortando en ``limite`` km"""
+    dist = {origen: 0.0}
+    cola = [(0.0, origen)]
+    pendientes = len(objetivos)
+    asentados = 0
+    while cola and pendientes and asentados < LIMITE_TESTIGOS:
+        d, actual = heapq.heappop(cola)
+        if d > dist[actual]:
+            continue
+        if d > limite:
+            break
+        asentados += 1
+        if actual in objetivos:
+            pendientes -= 1
+        for vecino, peso in salida[actual].items():
+            if vecino == evitado:
+                continue
+            nueva = d + peso
+            if nueva < dist.get(vecino, math.inf):
+                dist[vecino] = nueva
+                heapq.heappush(cola, (nueva, vecino))
+    return dist
+
+def _atajos(salida, entrada, v):
+    """Atajos ``(u, w, peso)`` necesarios para contraer ``v``"""
+    atajos = []
+    for u, peso_entrada in entrada[v].items():
+        objetivos = {w: peso_entrada + peso_salida for w, peso_salida in salida[v].items() if w != u}
+        if not objetivos:
+            continue
+        dist = _testigos(salida, u, v, objetivos, max(objetivos.values()))
+        for w, peso in objetivos.items():
+            if dist.get(w, math.inf) > peso:
+                atajos.append((u, w, peso))
+    return atajos
+
+def calcular_jerarquia(grafo):
+    """Contrae todos los nodos de un ``GrafoCSR``; devuelve el diccionario de arreglos"""
+    n = grafo.n
+    salida = [{} for _ in range(n)]
+    entrada = [{} for _ in range(n)]
+    medios = {}
+    for u in range(n):
+        for w, peso in grafo.vecinos(u):
+            # Se conserva la arista más corta si hay repetidas
+            if w != u and peso < salida[u].get(w, math.inf):
+                salida[u][w] = peso
+                entrada[w][u] = peso
+
+    contraidos_vecinos = [0] * n
+
+    def importancia(v, atajos):
+        # Diferencia de aristas más vecinos ya contraídos (reparte la contracción por el mapa)
+        return len(atajos) - len(salida[v]) - len(entrada[v]) + contraidos_vecinos[v]
+
+    cola = [(importancia(v, _atajos(salida, entrada, v)), v) for v in range(n)]
+    heapq.heapify(cola)
+    rango = np.empty(n, dtype=np.int32)
+    arriba = [None] * n
+    abajo = [None] * n
+    siguiente_rango = 0
+    while cola:
+        _, v = heapq.heappop(cola)
+        # Actualización perezosa: si la prioridad empeoró, el nodo vuelve a la cola
+        atajos = _atajos(salida, entrada, v)
+        prioridad = importancia(v, atajos)
+        if cola and prioridad > cola[0][0]:
+            heapq.heappush(cola, (prioridad, v))
+            continue
+
+        for u, w, peso in atajos:
+            if peso < salida[u].get(w, math.inf):
+                salida[u][w] = peso
+                entrada[w][u] = peso
+                medios[u, w] = v
+        # Las aristas que le quedan a v van todas hacia nodos de rango mayor
+        arriba[v] = [(w, peso, medios.get((v, w), -1)) for w, peso in salida[v].items()]
+        abajo[v] = [(u, peso, medios.get((u, v), -1)) for u, peso in entrada[v].items()]
+        for w in salida[v]:
+            del entrada[w][v]
+            contraidos_vecinos[w] += 1
+        for u in entrada[v]:
+            del salida[u][v]
+            contraidos_vecinos[u] += 1
+        salida[v] = {}
+        entrada[v] = {}
+        rango[v] = siguiente_rango
+        siguiente_rango += 1
+
+    arreglos = {'rango': rango}
+    for prefijo, listas in (('arriba', arriba), ('abajo', abajo)):
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(lista) for lista in listas], out=offsets[1:])
+        aristas = [arista for lista in listas for arista in lista]
+        arreglos[prefijo + '_offsets'] = offsets
+        arreglos[prefijo + '_destinos'] = np.array([a[0] for a in aristas], dtype=np.int32)
+        arreglos[prefijo + '_pesos'] = np.array([a[1] for a in aristas], dtype=np.float64)
+        arreglos[prefijo + '_medios'] = np.array([a[2] for a in aristas], dtype=np.int32)
+    return arreglos
+
+def guardar_jerarquia(ruta_jerarquia, huella, arreglos):
+    n = len(arreglos['rango'])
+    m_arriba, m_abajo = len(arreglos['arriba_destinos']), len(arreglos['abajo_destinos'])
+    FORMATO.escribir(ruta_jerarquia, (n, m_arriba, m_abajo, bytes.fromhex(huella)),
+                     _secciones(n, m_arriba, m_abajo), arreglos)
+
+class Jerarquia:
+    """Grafo hacia arriba y hacia abajo de la CH, con la consulta bidireccional"""
+
+    def __init__(self, arreglos, huella=None):
+        self.arreglos = arreglos
+        self.huella = huella
+        self.n = len(arreglos['rango'])
+
+    @classmethod
+    def abrir(cls, ruta_jerarquia):
+        """Vista de solo lectura, mapeada en memoria, sobre un archivo ``.jerarquia``"""
+        n, m_arriba, m_abajo, huella = FORMATO.leer_cabecera(ruta_jerarquia)
+        return cls(FORMATO.mapear(ruta_jerarquia, _secciones(n, m_arriba, m_abajo)), huella.hex())
+
+    @classmethod
+    def cargar_o_construir(cls, grafo, huella, ruta_jerarquia):
+        """Abre la jerarquía; la recalcula si falta o no coincide con ``huella``"""
+        return cargar_o_construir(ruta_jerarquia, cls.abrir,
+                                  lambda jerarquia: jerarquia.huella == huella and jerarquia.n == grafo.n,
+                                  lambda ruta: guardar_jerarquia(ruta, huella, calcular_jerarquia(grafo)))
+
+    # Aristas de cada nodo como tuplas (destino, peso, medio) para los bucles de
+    # consulta; se arman en la primera consulta, como las listas de ``GrafoCSR``
+    @cached_property
+    def _adyacencia(self):
+        adyacencia = {}
+        for prefijo in ('arriba', 'abajo'):
+            offsets = self.arreglos[prefijo + '_offsets'].tolist()
+            aristas = list(zip(self.arreglos[prefijo + '_destinos'].tolist(),
+                               self.arreglos[prefijo + '_pesos'].tolist(),
+                               self.arreglos[prefijo + '_medios'].tolist()))
+            adyacencia[prefijo] = [aristas[offsets[i]:offsets[i + 1]] for i in range(self.n)]
+        return adyacencia
+
+    def _aristas(self, prefijo, nodo):
+        return self._adyacencia[prefijo][nodo]
+
+    def _arista(self, prefijo, nodo, otro):
+        """(peso, medio) de la arista entre ``nodo`` y ``otro`` guardada bajo ``nodo``"""
+        for destino, peso, medio in self._aristas(prefijo, nodo):
+            if destino == otro:
+                return peso, medio
+        raise KeyError((prefijo, nodo, otro))
+
+    def consulta(self, inicio, meta):
+        """``(ids, distancia, expandidos, empujes)`` del camino mínimo, o ``None`` si no hay camino"""
+        if inicio == meta:
+            return [inicio], 0.0, 0, 0
+        adyacencia = (self._adyacencia['arriba'], self._adyacencia['abajo'])
+        dist = ({inicio: 0.0}, {meta: 0.0})
+        # padres[lado][x] = (vecino, peso, medio) de la arista por la que se llegó a x
+        padres = ({inicio: None}, {meta: None})
+        colas = ([(0.0, inicio)], [(0.0, meta)])
+        mejor, encuentro = math.inf, None
+        expandidos = 0
+        empujes = 0
+
+        while colas[0] or colas[1]:
+            for lado in (0, 1):
+                cola = colas[lado]
+                if not cola:
+                    continue
+                d, actual = heapq.heappop(cola)
+                if d > dist[lado][actual]:
+                    continue
+                if d >= mejor:
+                    # Nada en esta cola puede mejorar el camino encontrado
+                    cola.clear()
+                    continue
+                otro = dist[1 - lado].get(actual)
+                if otro is not None and d + otro < mejor:
+                    mejor, encuentro = d + otro, actual
+                if self._estancado(adyacencia[1 - lado][actual], dist[lado], d):
+                    continue
+                expandidos += 1
+                for vecino, peso, medio in adyacencia[lado][actual]:
+                    nueva = d + peso
+                    if nueva < dist[lado].get(vecino, math.inf):
+                        dist[lado][vecino] = nueva
+                        padres[lado][vecino] = (actual, peso, medio)
+                        heapq.heappush(cola, (nueva, vecino))
+                        empujes += 1
+
+        if encuentro is None:
+            return None
+        # Aristas (u, w, peso, medio) del camino con atajos, de inicio a meta
+        aristas = []
+        nodo = encuentro
+        while padres[0][nodo] is not None:
+            anterior, peso, medio = padres[0][nodo]
+            aristas.append((anterior, nodo, peso, medio))
+            nodo = anterior
+        aristas.reverse()
+        nodo = encuentro
+        while padres[1][nodo] is not None:
+            siguiente, peso, medio = padres[1][nodo]
+            aristas.append((nodo, siguiente, peso, medio))
+            nodo = siguiente
+
+        camino, distancia = self._desempacar(inicio, aristas)
+        return camino, distancia, expandidos, empujes
+
+    @staticmethod
+    def _estancado(aristas_contrarias, dist, d):
+        """Stall-on-demand: un vecino de rango mayor ya llega al nodo por menos que ``d``.
+
+        Ese nodo no está en ningún camino mínimo hacia arriba, así que no
+        hace falta relajar sus aristas.
+        """
+        for vecino, peso, _ in aristas_contrarias:
+            if dist.get(vecino, math.inf) + peso < d:
+                return True
+        return False
+
+    def _desempacar(self, inicio, aristas):
+        """Reemplaza cada atajo por sus dos mitades hasta llegar a aristas reales"""
+        camino = [inicio]
+        distancia = 0.0
+        pila = list(reversed(aristas))
+        while pila:
+            u, w, peso, medio = pila.pop()
+            if medio < 0:
+                camino.append(w)
+                distancia += peso
+                continue
+            # El nodo medio tiene rango menor que u y w: ambas mitades se guardaron bajo él
+            pila.append((medio, w, *self._arista('arriba', medio, w)))
+            pila.append((u, medio, *self._arista('abajo', medio, u)))
+        return camino, distancia
+
+def verificar(motor, origenes=None):
+    """Compara la CH con Dijkstra en todos los pares (o desde los primeros ``origenes``)"""
+    from motor_rutas import distancias_desde
+
+    grafo = motor.grafo
+    pesos = {}
+    for u in range(grafo.n):
+        for w, peso in grafo.vecinos(u):
+            pesos[u, w] = min(peso, pesos.get((u, w), math.inf))
+    errores = 0
+    total = grafo.n if origenes is None else min(origenes, grafo.n)
+    for i in range(total):
+        referencia = distancias_desde(grafo, i)
+        for j in range(grafo.n):
+            resultado = motor.jerarquia.consulta(i, j)
+            if resultado is None:
+                correcto = math.isinf(referencia[j])
+            else:
+                camino, distancia, _, _ = resultado
+                recorrido = sum(pesos.get(par, math.inf) for par in zip(camino, camino[1:]))
+                correcto = (camino[0] == i and camino[-1] == j and distancia == recorrido
+                            and abs(distancia - referencia[j]) <= 1e-9 * max(1.0, referencia[j]))
+            if not correcto:
+                errores += 1
+                print(f"Diferencia en {grafo.nombres[i]} -> {grafo.nombres[j]}: {resultado} vs {referencia[j]}")
+    return total * grafo.n, errores
+
+if __name__ == '__main__':
+    from motor_rutas import MotorRutas
+
+    parser = argparse.ArgumentParser(description="Construye la jerarquía de contracción y la verifica contra Dijkstra")
+    parser.add_argument('json', nargs='?', default='conexiones.json')
+    parser.add_argument('--sintetico', type=int, default=0, metavar='NODOS',
+                        help="Usar un grafo sintético de este tamaño en lugar del JSON")
+    parser.add_argument('--verificar', action='store_true', help="Comparar con Dijkstra en todos los pares")
+    parser.add_argument('--origenes', type=int, default=None,
+                        help="Con --verificar, limitar la comparación a los primeros N orígenes")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.sintetico:
+        from grafo_sintetico import generar_grafo
+
+        motor = generar_grafo(args.sintetico)
+    else:
+        motor = MotorRutas(args.json)
+    jerarquia = motor.cargar_jerarquia()
+    print(f"Jerarquía lista en {time.perf_counter() - inicio:.2f} s: {jerarquia.n} nodos, "
+          f"{len(jerarquia.arreglos['arriba_destinos']) + len(jerarquia.arreglos['abajo_destinos'])} aristas con atajos")
+
+    if args.verificar:
+        pares, errores = verificar(motor, args.origenes)
+        print(f"Verificación: {pares} pares, {errores} diferencias con Dijkstra")
+        raise SystemExit(1 if errores else 0)
@@ -0,0 +1,146 @@
+"""Matrices de distancias uno a muchos y muchos a muchos.
+
+Cada origen es un solo Dijkstra que se detiene al asentar todos sus
+destinos; los orígenes se reparten entre procesos (cada uno recibe el grafo
+CSR una sola vez, al arrancar). Sirve para despacho: matrices completas sin
+pasar por la interfaz.
+
+Uso: ``python matriz_distancias.py [--json conexiones.json] [--entrada pares.csv] [--salida resultados.jsonl]
+[--caminos] [--procesos N] [--lote 10000]``
+
+La entrada es un CSV ``origen,destino`` (encabezado opcional; ``-`` es la
+entrada estándar) y la salida un JSON por línea, escrito a medida que se
+procesa cada lote para que la memoria no crezca con el tamaño del archivo.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from motor_rutas import GrafoCSR, MotorRutas, distancias_desde
+
+_grafo_trabajador = None
+
+def _iniciar_trabajador(nombres, offsets, destinos, pesos):
+    global _grafo_trabajador
+    _grafo_trabajador = GrafoCSR(nombres, offsets, destinos, pesos)
+
+def _fila_trabajador(tarea):
+    return uno_a_muchos(_grafo_trabajador, *tarea)
+
+def _camino(padres, origen, destino):
+    camino = [destino]
+    while camino[-1] != origen:
+        camino.append(padres[camino[-1]])
+    camino.reverse()
+    return camino
+
+def uno_a_muchos(grafo, origen, destinos, caminos=False):
+    """``(distancias, rutas)`` desde ``origen`` a cada id de ``destinos``; ``rutas`` es ``None`` sin ``caminos``"""
+    dist, padres = distancias_desde(grafo, origen, metas=destinos, con_padres=True)
+    fila = dist[np.asarray(destinos, dtype=np.int64)] if len(destinos) else np.empty(0)
+    if not caminos:
+        return fila, None
+    rutas = [_camino(padres, origen, destino) if np.isfinite(distancia) else None
+             for destino, distancia in zip(destinos, fila)]
+    return fila, rutas
+
+def _pool(grafo, procesos):
+    return ProcessPoolExecutor(
+        max_workers=procesos, initializer=_iniciar_trabajador,
+        initargs=(grafo.nombres, grafo.offsets, grafo.destinos, grafo.pesos))
+
+def _filas(grafo, tareas, procesos, pool=None):
+    """Resultados de ``uno_a_muchos`` para cada tarea, en orden; en paralelo si hay más de un proceso"""
+    if procesos == 1 or len(tareas) < 2:
+        return [uno_a_muchos(grafo, *tarea) for tarea in tareas]
+    if pool is not None:
+        return list(pool.map(_fila_trabajador, tareas, chunksize=max(1, len(tareas) // (4 * procesos))))
+    with _pool(grafo, procesos) as pool:
+        return _filas(grafo, tareas, procesos, pool)
+
+def muchos_a_muchos(grafo, origenes, destinos, caminos=False, procesos=None):
+    """Matriz ``len(origenes) × len(destinos)`` (``inf`` sin camino) y, con ``caminos``, las rutas en ids"""
+    procesos = procesos or os.cpu_count() or 1
+    destinos = list(destinos)
+    filas = _filas(grafo, [(origen, destinos, caminos) for origen in origenes], procesos)
+    matriz = np.array([fila for fila, _ in filas]).reshape(len(origenes), len(destinos))
+    return matriz, ([rutas for _, rutas in filas] if caminos else None)
+
+def _leer_pares(archivo):
+    """Pares (origen, destino) del CSV, saltando el encabezado si lo hay"""
+    for numero, fila in enumerate(csv.reader(archivo)):
+        if not fila or (numero == 0 and [c.strip().lower() for c in fila[:2]] == ['origen', 'destino']):
+            continue
+        yield fila[0].strip(), fila[1].strip() if len(fila) > 1 else ''
+
+def _lotes(iterable, tamano):
+    lote = []
+    for elemento in iterable:
+        lote.append(elemento)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def procesar_pares(motor, pares, salida, caminos=False, procesos=None, lote=10000):
+    """Escribe una línea JSON por par; agrupa cada lote por origen para un solo Dijkstra por origen"""
+    procesos = procesos or os.cpu_count() or 1
+    grafo = motor.grafo
+    pool = _pool(grafo, procesos) if procesos > 1 else None
+    try:
+        for pares_lote in _lotes(pares, lote):
+            # destinos de cada origen dentro del lote, sin repetir
+            por_origen = {}
+            for origen, destino in pares_lote:
+                if origen in grafo.indice and destino in grafo.indice:
+                    por_origen.setdefault(grafo.indice[origen], {})[grafo.indice[destino]] = None
+            tareas = [(origen, list(destinos), caminos) for origen, destinos in por_origen.items()]
+            respuestas = {}
+            for (origen, destinos, _), (fila, rutas) in zip(tareas, _filas(grafo, tareas, procesos, pool)):
+                for k, destino in enumerate(destinos):
+                    respuestas[origen, destino] = (fila[k], rutas[k] if rutas else None)
+
+            for origen, destino in pares_lote:
+                registro = {'origen': origen, 'destino': destino}
+                if origen not in grafo.indice or destino not in grafo.indice:
+                    registro['error'] = "Ciudad desconocida"
+                else:
+                    distancia, ruta = respuestas[grafo.indice[origen], grafo.indice[destino]]
+                    registro['distancia'] = float(distancia) if np.isfinite(distancia) else None
+                    if caminos:
+                        registro['ruta'] = None if ruta is None else [grafo.nombres[i] for i in ruta]
+                salida.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            salida.flush()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Distancias para pares origen,destino leídos de un CSV")
+    parser.add_argument('--json', default='conexiones.json')
+    parser.add_argument('--entrada', default='-', help="CSV origen,destino ('-' para la entrada estándar)")
+    parser.add_argument('--salida', default='-', help="Archivo JSONL ('-' para la salida estándar)")
+    parser.add_argument('--caminos', action='store_true', help="Incluir la secuencia de ciudades")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos de trabajo (por defecto, uno por CPU)")
+    parser.add_argument('--lote', type=int, default=10000, help="Pares leídos por lote")
+    args = parser.parse_args()
+
+    motor = MotorRutas(args.json)
+    entrada = sys.stdin if args.entrada == '-' else open(args.entrada, 'r', encoding='utf-8', newline='')
+    salida = sys.stdout if args.salida == '-' else open(args.salida, 'w', encoding='utf-8')
+    try:
+        procesar_pares(motor, _leer_pares(entrada), salida, args.caminos, args.procesos, args.lote)
+    finally:
+        if entrada is not sys.stdin:
+            entrada.close()
+        if salida is not sys.stdout:
+            salida.close()
+
+if __name__ == '__main__':
+    main()
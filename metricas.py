@@ -0,0 +1,111 @@
+"""Métricas ligeras por consulta: contadores y tiempos por fase.
+
+Una ``Metricas`` acompaña a una consulta desde la búsqueda hasta el render
+(que corre en otro hilo) y se resume en el panel de resultados. Con la
+variable de entorno ``RUTAS_METRICAS`` además se exporta:
+
+- ``jsonl``: una línea JSON por consulta en ``RUTAS_METRICAS_ARCHIVO``
+  (``metricas.jsonl`` por defecto)
+- ``perfil``: las fases se perfilan con cProfile y cada consulta deja una
+  instantánea ``.prof`` en ``RUTAS_METRICAS_DIR`` (``perfiles`` por defecto),
+  legible con ``python -m pstats``
+"""
+import cProfile
+import contextlib
+import json
+import os
+import pstats
+import threading
+import time
+
+MODO = os.environ.get('RUTAS_METRICAS', '')
+_bloqueo_archivo = threading.Lock()
+
+class Metricas:
+    def __init__(self, etiqueta, **datos):
+        self.etiqueta = etiqueta
+        self.datos = datos
+        self.contadores = {}
+        self.fases = {}
+        self.inicio = time.perf_counter()
+        self._bloqueo = threading.Lock()
+        # Un perfilador por hilo: la búsqueda corre en el de Tk y el render en el trabajador
+        self._perfiles = {}
+        self._profundidad = {}
+
+    def contar(self, nombre, cantidad=1):
+        with self._bloqueo:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    @contextlib.contextmanager
+    def fase(self, nombre):
+        """Suma a ``nombre`` el tiempo del bloque, en ms"""
+        perfil = self._entrar_perfil() if MODO == 'perfil' else None
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            if perfil is not None:
+                self._salir_perfil(perfil)
+            with self._bloqueo:
+                self.fases[nombre] = self.fases.get(nombre, 0.0) + ms
+
+    def _entrar_perfil(self):
+        hilo = threading.get_ident()
+        with self._bloqueo:
+            perfil = self._perfiles.setdefault(hilo, cProfile.Profile())
+            self._profundidad[hilo] = self._profundidad.get(hilo, 0) + 1
+            externa = self._profundidad[hilo] == 1
+        if externa:
+            perfil.enable()
+        return perfil
+
+    def _salir_perfil(self, perfil):
+        hilo = threading.get_ident()
+        with self._bloqueo:
+            self._profundidad[hilo] -= 1
+            externa = self._profundidad[hilo] == 0
+        if externa:
+            perfil.disable()
+
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def resumen(self):
+        """Texto corto para el panel de resultados"""
+        lineas = [f"⏱ Total: {self.total_ms():.1f} ms"]
+        with self._bloqueo:
+            if self.fases:
+                lineas.append("   " + " · ".join(f"{nombre} {ms:.1f}" for nombre, ms in self.fases.items()))
+            if self.contadores:
+                lineas.append("   " + " · ".join(f"{nombre}: {valor}" for nombre, valor in self.contadores.items()))
+        return "\n".join(lineas)
+
+    def a_dict(self):
+        with self._bloqueo:
+            return {'etiqueta': self.etiqueta, 'momento': time.time(), **self.datos,
+                    'total_ms': round(self.total_ms(), 3),
+                    'fases_ms': {nombre: round(ms, 3) for nombre, ms in self.fases.items()},
+                    'contadores': dict(self.contadores)}
+
+    def exportar(self):
+        """Escribe la consulta según ``RUTAS_METRICAS``; sin la variable no hace nada"""
+        if MODO == 'jsonl':
+            archivo = os.environ.get('RUTAS_METRICAS_ARCHIVO', 'metricas.jsonl')
+            linea = json.dumps(self.a_dict(), ensure_ascii=False)
+            with _bloqueo_archivo, open(archivo, 'a', encoding='utf-8') as f:
+                f.write(linea + '\n')
+        elif MODO == 'perfil' and self._perfiles:
+            carpeta = os.environ.get('RUTAS_METRICAS_DIR', 'perfiles')
+            os.makedirs(carpeta, exist_ok=True)
+            perfiles = list(self._perfiles.values())
+            estadisticas = pstats.Stats(perfiles[0])
+            for perfil in perfiles[1:]:
+                estadisticas.add(perfil)
+            nombre = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(self.inicio * 1000) % 1000:03d}-{self.etiqueta}.prof"
+            estadisticas.dump_stats(os.path.join(carpeta, nombre))
+
+def medir(metricas, nombre):
+    """``metricas.fase(nombre)``, o un bloque vacío si no hay métricas"""
+    return metricas.fase(nombre) if metricas is not None else contextlib.nullcontext()
@@ -0,0 +1,820 @@
+"""Motor de rutas sin interfaz: grafo CSR indexado por enteros y algoritmos de búsqueda.
+
+No importa Tk, folium ni Selenium, así que puede usarse desde procesos de
+servidor; la interfaz de ``ciudades.py`` es solo un cliente de este módulo.
+"""
+import hashlib
+import heapq
+import json
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
+
+RADIO_TIERRA_KM = 6371.0
+# Hasta este número de nodos la heurística se precalcula como matriz n×n (32 MB)
+UMBRAL_MATRIZ_HEURISTICA = 2048
+# Valores (floats de Python) guardados entre todas las filas de heurística en caché
+VALORES_CACHE_HEURISTICA = 1_000_000
+
+# Coordenadas de las capitales
+coordenadas = {
+    'Leticia': (-4.2129211, -69.9425963),
+    'Medellín': (6.269732449999999, -75.60255965090315),
+    'Arauca': (6.6666755, -71.0000086),
+    'Barranquilla': (11.0101922, -74.8231794084391),
+    'Cartagena de Indias': (10.4265566, -75.5441671),
+    'Tunja': (5.5324313, -73.3616014),
+    'Manizales': (5.0743694, -75.50811667440546),
+    'Florencia': (1.6158666, -75.6143045),
+    'Yopal': (5.3356662, -72.3936931),
+    'Popayán': (2.4422295, -76.6072368),
+    'Valledupar': (10.34311145, -73.37579338828454),
+    'Quibdó': (5.6923407, -76.6583801),
+    'Montería': (8.6046053, -75.97832027208273),
+    'Bogotá': (4.6533816, -74.0836333),
+    'Inírida': (3.8650368, -67.9259848),
+    'San José del Guaviare': (2.5716141, -72.6426515),
+    'Neiva': (2.9257038, -75.2893937),
+    'Riohacha': (11.236191300000002, -72.88204560476245),
+    'Santa Marta': (11.2320944, -74.1950916),
+    'Villavicencio': (4.1347644, -73.6201517),
+    'Pasto': (1.2140275, -77.2785096),
+    'San José de Cúcuta': (8.07761875, -72.46890019811272),
+    'Mocoa': (1.1466295, -76.6482327),
+    'Armenia': (4.491976149999999, -75.74135085294314),
+    'Pereira': (4.7854606, -75.7883220137654),
+    'San Andrés': (12.537597850000001, -81.72041550499901),
+    'Bucaramanga': (7.16698415, -73.1047294009737),
+    'Sincelejo': (9.2973386, -75.3926601),
+    'Ibagué': (4.4386033, -75.2108857),
+    'Cali': (3.4519988, -76.5325259),
+    'Mitú': (1.2538499, -70.2345576),
+    'Puerto Carreño': (6.1909225, -67.4841891)
+}
+
+@dataclass
+class ResultadoRuta:
+    """Resultado de una consulta de ruta"""
+    ruta: list
+    distancia: float
+    algoritmo: str
+    expandidos: int = 0
+    empujes: int = 0
+
+@dataclass
+class CambioPeso:
+    """Cambio de peso de una arista dirigida (ids); ``nuevo`` es ``inf`` si la vía se cerró"""
+    origen: int
+    destino: int
+    anterior: float
+    nuevo: float
+
+class GrafoCSR:
+    """Adyacencia en formato CSR: ids enteros y arreglos offsets/destinos/pesos"""
+
+    def __init__(self, nombres, offsets, destinos, pesos):
+        self.nombres = list(nombres)
+        self.indice = {nombre: i for i, nombre in enumerate(self.nombres)}
+        self.offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self.destinos = np.ascontiguousarray(destinos, dtype=np.int32)
+        self.pesos = np.ascontiguousarray(pesos, dtype=np.float64)
+
+    # Copias en listas para los bucles de búsqueda: indexar escalares de NumPy
+    # desde Python es varias veces más lento que indexar listas. Se crean en
+    # la primera búsqueda para que una carga mapeada en memoria no copie nada.
+    @cached_property
+    def _offsets(self):
+        return self.offsets.tolist()
+
+    @cached_property
+    def _destinos(self):
+        return self.destinos.tolist()
+
+    @cached_property
+    def _pesos(self):
+        return self.pesos.tolist()
+
+    @classmethod
+    def desde_datos(cls, datos):
+        """Construye el grafo a partir del diccionario de ``conexiones.json``"""
+        nombres = list(datos['capitales'])
+        vistos = set(nombres)
+        for ciudad, conexiones in datos['conexiones'].items():
+            for nombre in (ciudad, *conexiones):
+                if nombre not in vistos:
+                    vistos.add(nombre)
+                    nombres.append(nombre)
+        indice = {nombre: i for i, nombre in enumerate(nombres)}
+
+        offsets = np.zeros(len(nombres) + 1, dtype=np.int64)
+        destinos = []
+        pesos = []
+        for i, ciudad in enumerate(nombres):
+            conexiones = datos['conexiones'].get(ciudad, {})
+            for destino, distancia in conexiones.items():
+                destinos.append(indice[destino])
+                pesos.append(float(distancia))
+            offsets[i + 1] = len(destinos)
+        return cls(nombres, offsets, destinos, pesos)
+
+    @classmethod
+    def desde_aristas(cls, nombres, origenes, destinos, pesos):
+        """Construye el CSR ordenando una lista de aristas dirigidas por origen"""
+        origenes = np.asarray(origenes, dtype=np.int64)
+        orden = np.argsort(origenes, kind='stable')
+        offsets = np.zeros(len(nombres) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(origenes, minlength=len(nombres)), out=offsets[1:])
+        return cls(nombres, offsets, np.asarray(destinos)[orden], np.asarray(pesos)[orden])
+
+    @cached_property
+    def invertido(self):
+        """Grafo con las aristas en sentido contrario, para búsquedas hacia atrás"""
+        origenes = np.repeat(np.arange(self.n), np.diff(self.offsets))
+        return GrafoCSR.desde_aristas(self.nombres, self.destinos, origenes, self.pesos)
+
+    @property
+    def n(self):
+        return len(self.nombres)
+
+    @property
+    def m(self):
+        return len(self.destinos)
+
+    def a_datos(self, capitales):
+        """Reconstruye la estructura de ``conexiones.json`` desde los arreglos CSR"""
+        conexiones = {}
+        for i, ciudad in enumerate(self.nombres):
+            conexiones[ciudad] = {self.nombres[j]: peso for j, peso in self.vecinos(i)}
+        return {'capitales': list(capitales), 'conexiones': conexiones}
+
+    def vecinos(self, i):
+        """Pares (id_vecino, peso) de las aristas salientes de ``i``"""
+        inicio, fin = self._offsets[i], self._offsets[i + 1]
+        return zip(self._destinos[inicio:fin], self._pesos[inicio:fin])
+
+    def posiciones(self, i, j):
+        """Posiciones en los arreglos CSR de las aristas ``i -> j`` (vacía si no hay vía directa)"""
+        inicio, fin = self._offsets[i], self._offsets[i + 1]
+        return [k for k in range(inicio, fin) if self._destinos[k] == j]
+
+    def actualizar_arista(self, i, j, peso):
+        """Fija el peso de las aristas ``i -> j`` y devuelve el anterior (el menor, si hay repetidas).
+
+        Los arreglos mapeados en memoria son de solo lectura: se copian en la
+        primera escritura. El grafo invertido, si ya se armó, se actualiza igual.
+        """
+        posiciones = self.posiciones(i, j)
+        anterior = min(self._pesos[k] for k in posiciones)
+        if not self.pesos.flags.writeable:
+            self.pesos = np.array(self.pesos)
+        for k in posiciones:
+            self.pesos[k] = peso
+            self._pesos[k] = peso
+        if 'invertido' in self.__dict__:
+            self.invertido.actualizar_arista(j, i, peso)
+        return anterior
+
+class MotorRutas:
+    """Responde consultas ``ruta(origen, destino, algoritmo)`` sobre el grafo"""
+
+    def __init__(self, ruta_json='conexiones.json', datos=None, usar_binario=True):
+        from formato_grafo import cargar_si_vigente, ruta_grafo_por_defecto
+
+        self.ruta_json = ruta_json
+        binario = None
+        leido = False
+        if datos is None and usar_binario:
+            binario = cargar_si_vigente(ruta_grafo_por_defecto(ruta_json), ruta_json)
+
+        if binario is not None:
+            # Carga en frío: vistas sobre el archivo mapeado, sin parsear JSON
+            self.grafo = GrafoCSR(binario.nombres, binario.offsets, binario.destinos, binario.pesos)
+            self.latitudes = binario.latitudes
+            self.longitudes = binario.longitudes
+            self.capitales = binario.nombres[:binario.n_capitales]
+            self.huella = binario.huella
+            self._datos = None
+        else:
+            # Solo lo leído de ``ruta_json`` puede regenerar su binario
+            leido = datos is None
+            if leido:
+                with open(ruta_json, 'rb') as f:
+                    contenido = f.read()
+                datos = json.loads(contenido.decode('utf-8'))
+            else:
+                contenido = json.dumps(datos, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            self.huella = hashlib.sha256(contenido).hexdigest()
+            self._datos = datos
+            self.grafo = GrafoCSR.desde_datos(datos)
+            self.capitales = list(datos['capitales'])
+
+            # Grafos grandes traen sus coordenadas en el JSON; las capitales usan la tabla del módulo
+            fuente = {**coordenadas, **{k: tuple(v) for k, v in datos.get('coordenadas', {}).items()}}
+            latlon = [fuente.get(nombre, (math.nan, math.nan)) for nombre in self.grafo.nombres]
+            self.latitudes = np.array([p[0] for p in latlon], dtype=np.float64)
+            self.longitudes = np.array([p[1] for p in latlon], dtype=np.float64)
+        self._preparar()
+        if binario is None and usar_binario and leido:
+            # El binario faltaba o estaba viejo: se regenera para la próxima carga
+            try:
+                self.guardar_binario(ruta_grafo_por_defecto(ruta_json))
+            except OSError:
+                pass
+
+    @classmethod
+    def desde_grafo(cls, grafo, latitudes, longitudes, capitales=None):
+        """Motor sobre un ``GrafoCSR`` ya construido (p. ej. un grafo sintético)"""
+        motor = cls.__new__(cls)
+        motor.ruta_json = None
+        motor.grafo = grafo
+        motor.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        motor.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        motor.capitales = list(grafo.nombres if capitales is None else capitales)
+        sha = hashlib.sha256('\n'.join(grafo.nombres).encode('utf-8'))
+        for arreglo in (grafo.offsets, grafo.destinos, grafo.pesos, motor.latitudes, motor.longitudes):
+            sha.update(arreglo.tobytes())
+        motor.huella = sha.hexdigest()
+        motor._datos = None
+        motor._preparar()
+        return motor
+
+    def _preparar(self):
+        """Estado derivado común a todas las formas de construir el motor"""
+        self.ciudades_ordenadas = sorted(self.capitales)
+
+        # La matriz completa solo cabe para grafos pequeños; en grafos grandes
+        # cada consulta calcula la cota de un nodo solo cuando lo alcanza
+        if self.grafo.n <= UMBRAL_MATRIZ_HEURISTICA:
+            self.matriz_heuristica = matriz_haversine(self.latitudes, self.longitudes)
+        else:
+            self.matriz_heuristica = None
+        self._indice_espacial = None
+        # Cotas ya calculadas por (nodo, hitos, sentido): destinos repetidos no recalculan
+        self._filas_heuristica = OrderedDict()
+        self._capacidad_filas = max(1, min(64, VALORES_CACHE_HEURISTICA // max(self.grafo.n, 1)))
+        self.aciertos_heuristica = 0
+        self.fallos_heuristica = 0
+
+        self.algoritmos = {
+            'voraz': self._voraz,
+            'a_estrella': self._a_estrella,
+            'bidireccional': self._bidireccional,
+            'dijkstra': self._dijkstra,
+        }
+        self.tabla = None
+        self.hitos = None
+        self.jerarquia = None
+        # Pesos de la red tal como se cargó; ``None`` mientras no haya cambios en caliente
+        self._pesos_originales = None
+        self._jerarquia_vencida = False
+        # Los cambios de peso y las cargas en segundo plano (p. ej. la tabla) no se pisan
+        self._bloqueo_pesos = threading.RLock()
+
+    @property
+    def datos(self):
+        """Estructura de ``conexiones.json``; se reconstruye del CSR si se cargó el binario.
+
+        Siempre con los pesos originales: los cambios en caliente se consultan
+        con ``vias_modificadas``.
+        """
+        if self._datos is None:
+            self._datos = self._grafo_base().a_datos(self.capitales)
+        return self._datos
+
+    def guardar_binario(self, ruta_grafo):
+        """Escribe el grafo en el formato binario de ``formato_grafo``"""
+        from formato_grafo import escribir_grafo
+
+        escribir_grafo(ruta_grafo, self._grafo_base(), self.latitudes, self.longitudes,
+                       len(self.capitales), self.ruta_json)
+
+    def id_ciudad(self, nombre):
+        """Id entero de una ciudad; ``ValueError`` si no existe en el grafo"""
+        try:
+            return self.grafo.indice[nombre]
+        except KeyError:
+            raise ValueError(f"Ciudad desconocida: {nombre!r}") from None
+
+    def ruta(self, origen, destino, algoritmo='a_estrella', metricas=None):
+        """Busca la ruta entre dos ciudades; devuelve ``None`` si no hay camino.
+
+        Con ``metricas`` (ver ``metricas.Metricas``) registra el tiempo de la
+        búsqueda y sus contadores.
+        """
+        from metricas import medir
+
+        if algoritmo not in self.algoritmos:
+            raise ValueError(f"Algoritmo desconocido: {algoritmo!r}")
+        inicio = self.id_ciudad(origen)
+        meta = self.id_ciudad(destino)
+        aciertos, fallos = self.aciertos_heuristica, self.fallos_heuristica
+        with medir(metricas, 'búsqueda'):
+            resultado = self.algoritmos[algoritmo](inicio, meta)
+        if metricas is not None:
+            metricas.contar('heurística en caché', self.aciertos_heuristica - aciertos)
+            metricas.contar('heurística calculada', self.fallos_heuristica - fallos)
+        if resultado is None:
+            return None
+        ids, distancia, expandidos, empujes = resultado
+        if metricas is not None:
+            metricas.contar('expandidos', expandidos)
+            metricas.contar('empujes al heap', empujes)
+        nombres = self.grafo.nombres
+        return ResultadoRuta([nombres[i] for i in ids], distancia, algoritmo, expandidos, empujes)
+
+    def cargar_tabla(self, ruta_tabla=None):
+        """Mapea en memoria la tabla de todos los pares y habilita el algoritmo ``'tabla'``.
+
+        La tabla se recalcula solo si falta o si ``conexiones.json`` cambió.
+        """
+        from tabla_rutas import TablaRutas, ruta_tabla_por_defecto
+
+        if ruta_tabla is None:
+            ruta_tabla = ruta_tabla_por_defecto(self.ruta_json)
+        # El archivo corresponde siempre a los pesos originales; los cambios se reaplican encima
+        tabla = TablaRutas.cargar_o_construir(self._grafo_base(), self.huella, ruta_tabla)
+        with self._bloqueo_pesos:
+            self._reaplicar_en_tabla(tabla)
+            self.tabla = tabla
+        self.algoritmos['tabla'] = self._tabla
+        return self.tabla
+
+    def cargar_hitos(self, ruta_hitos=None, k=None):
+        """Carga (o calcula) los hitos ALT y habilita ``'alt'`` y ``'alt_bidireccional'``.
+
+        Los grafos sin JSON de origen (p. ej. sintéticos) calculan los hitos
+        en memoria sin persistirlos.
+        """
+        from hitos import HITOS_POR_DEFECTO, Hitos, calcular_hitos, ruta_hitos_por_defecto
+
+        k = HITOS_POR_DEFECTO if k is None else k
+        if ruta_hitos is None and self.ruta_json is not None:
+            ruta_hitos = ruta_hitos_por_defecto(self.ruta_json)
+        if ruta_hitos is None:
+            hitos = Hitos(*calcular_hitos(self.grafo, k), huella=self.huella)
+        else:
+            hitos = Hitos.cargar_o_construir(self._grafo_base(), self.huella, ruta_hitos, k)
+        with self._bloqueo_pesos:
+            hitos.reparar(self.grafo, self._aristas_modificadas())
+            self.hitos = hitos
+            self._descartar_filas_hitos()
+        self.algoritmos['alt'] = self._alt
+        self.algoritmos['alt_bidireccional'] = self._alt_bidireccional
+        return self.hitos
+
+    def cargar_jerarquia(self, ruta_jerarquia=None):
+        """Carga (o construye) la jerarquía de contracción y habilita ``'jerarquia'``"""
+        from jerarquia import Jerarquia, calcular_jerarquia, ruta_jerarquia_por_defecto
+
+        if ruta_jerarquia is None and self.ruta_json is not None:
+            ruta_jerarquia = ruta_jerarquia_por_defecto(self.ruta_json)
+        with self._bloqueo_pesos:
+            modificado = bool(self._aristas_modificadas())
+        if ruta_jerarquia is None or modificado:
+            # El archivo solo vale para los pesos originales
+            self.jerarquia = Jerarquia(calcular_jerarquia(self.grafo), huella=self.huella_vigente)
+        else:
+            self.jerarquia = Jerarquia.cargar_o_construir(self.grafo, self.huella, ruta_jerarquia)
+        self._jerarquia_vencida = False
+        self.algoritmos['jerarquia'] = self._jerarquia
+        return self.jerarquia
+
+    def actualizar_peso(self, origen, destino, peso, ambos_sentidos=True):
+        """Cambia en caliente el peso de la vía directa entre dos ciudades (``inf`` la cierra).
+
+        La tabla y los hitos se reparan solo donde el cambio los afecta y la
+        jerarquía se reconstruye en su próxima consulta. Devuelve los
+        ``CambioPeso`` aplicados, para invalidar cachés con ``ruta_afectada``.
+        """
+        i, j = self.id_ciudad(origen), self.id_ciudad(destino)
+        return self._aplicar_pesos([(a, b, float(peso)) for a, b in self._sentidos(i, j, ambos_sentidos)])
+
+    def cerrar_via(self, origen, destino, ambos_sentidos=True):
+        """Cierra la vía directa entre dos ciudades; ver ``actualizar_peso``"""
+        return self.actualizar_peso(origen, destino, math.inf, ambos_sentidos)
+
+    def reabrir_via(self, origen, destino, ambos_sentidos=True):
+        """Devuelve a la vía directa entre dos ciudades su peso original"""
+        i, j = self.id_ciudad(origen), self.id_ciudad(destino)
+        return self._aplicar_pesos([(a, b, self._peso_original(a, b)) for a, b in self._sentidos(i, j, ambos_sentidos)])
+
+    def restaurar_pesos(self):
+        """Deshace todos los cambios en caliente"""
+        with self._bloqueo_pesos:
+            aristas = [(i, j, self._peso_original(i, j)) for i, j, _ in self._aristas_modificadas()]
+            return self._aplicar_pesos(aristas)
+
+    def vias_modificadas(self):
+        """``(origen, destino, peso_original, peso_actual)`` de cada arista dirigida cambiada"""
+        nombres = self.grafo.nombres
+        with self._bloqueo_pesos:
+            return [(nombres[i], nombres[j], self._peso_original(i, j), peso)
+                    for i, j, peso in self._aristas_modificadas()]
+
+    @property
+    def huella_vigente(self):
+        """Huella de la red con los pesos actuales; igual a ``huella`` si no hay cambios en caliente"""
+        with self._bloqueo_pesos:
+            aristas = self._aristas_modificadas()
+        if not aristas:
+            return self.huella
+        sha = hashlib.sha256(self.huella.encode('ascii'))
+        sha.update(np.array(aristas, dtype=np.float64).tobytes())
+        return sha.hexdigest()
+
+    def ruta_afectada(self, resultado, cambios):
+        """Si un ``ResultadoRuta`` guardado puede haber dejado de ser correcto tras ``cambios``.
+
+        Un encarecimiento solo afecta a las rutas que usan la arista; un
+        abaratamiento, a las que podrían acortarse pasando por ella según la
+        cota del gran círculo. La voraz no garantiza nada y se invalida siempre.
+        """
+        if resultado.algoritmo == 'voraz':
+            return bool(cambios)
+        ids = [self.grafo.indice[ciudad] for ciudad in resultado.ruta]
+        tramos = set(zip(ids, ids[1:]))
+        inicio, meta = ids[0], ids[-1]
+        for cambio in cambios:
+            if cambio.nuevo > cambio.anterior and (cambio.origen, cambio.destino) in tramos:
+                return True
+            if (cambio.nuevo < cambio.anterior and self.heuristica(inicio, cambio.origen) + cambio.nuevo
+                    + self.heuristica(cambio.destino, meta) < resultado.distancia):
+                return True
+        return False
+
+    def _sentidos(self, i, j, ambos_sentidos):
+        """Aristas dirigidas existentes entre ``i`` y ``j``; ``ValueError`` si no hay vía directa"""
+        sentidos = [(a, b) for a, b in ([(i, j), (j, i)] if ambos_sentidos else [(i, j)])
+                    if self.grafo.posiciones(a, b)]
+        if not sentidos:
+            nombres = self.grafo.nombres
+            raise ValueError(f"No hay vía directa entre {nombres[i]!r} y {nombres[j]!r}")
+        return sentidos
+
+    def _peso_original(self, i, j):
+        pesos = self.grafo._pesos if self._pesos_originales is None else self._pesos_originales
+        return min(float(pesos[k]) for k in self.grafo.posiciones(i, j))
+
+    def _aristas_modificadas(self):
+        """``(i, j, peso_actual)`` de cada arista dirigida cuyo peso difiere del original"""
+        if self._pesos_originales is None:
+            return []
+        cambiadas = np.flatnonzero(self.grafo.pesos != self._pesos_originales)
+        origenes = np.searchsorted(self.grafo.offsets, cambiadas, side='right') - 1
+        aristas = {(int(i), int(self.grafo.destinos[k])): float(self.grafo.pesos[k])
+                   for i, k in zip(origenes, cambiadas)}
+        return [(i, j, peso) for (i, j), peso in aristas.items()]
+
+    def _grafo_base(self):
+        """El grafo con los pesos originales (el mismo objeto si no hay cambios)"""
+        if self._pesos_originales is None:
+            return self.grafo
+        return GrafoCSR(self.grafo.nombres, self.grafo.offsets, self.grafo.destinos, self._pesos_originales)
+
+    def _aplicar_pesos(self, aristas):
+        """Aplica ``(i, j, peso)`` una arista a la vez, reparando lo que depende de cada una"""
+        for i, j, peso in aristas:
+            if peso < 0 or math.isnan(peso):
+                raise ValueError(f"Peso inválido: {peso}")
+            # Más corto que el gran círculo, la heurística dejaría de ser admisible
+            if peso < self.heuristica(i, j) - 1e-9 and peso != self._peso_original(i, j):
+                raise ValueError(f"{peso} km es menos que la distancia en línea recta entre "
+                                 f"{self.grafo.nombres[i]!r} y {self.grafo.nombres[j]!r}")
+        cambios = []
+        with self._bloqueo_pesos:
+            if self._pesos_originales is None:
+                self._pesos_originales = np.array(self.grafo.pesos)
+            for i, j, peso in aristas:
+                anterior = self.grafo.actualizar_arista(i, j, peso)
+                if anterior == peso:
+                    continue
+                cambios.append(CambioPeso(i, j, anterior, peso))
+                if self.tabla is not None:
+                    self.tabla.reparar(self.grafo, i, j, anterior, peso)
+            if self.hitos is not None and any(c.nuevo < c.anterior for c in cambios):
+                if self.hitos.reparar(self.grafo, [(c.origen, c.destino, c.nuevo) for c in cambios]):
+                    self._descartar_filas_hitos()
+            if cambios and self.jerarquia is not None:
+                self._jerarquia_vencida = True
+        return cambios
+
+    def _reaplicar_en_tabla(self, tabla):
+        """Lleva una tabla de los pesos originales a los actuales, un cambio a la vez"""
+        aristas = self._aristas_modificadas()
+        if not aristas:
+            return
+        pesos = np.array(self._pesos_originales)
+        for i, j, peso in aristas:
+            posiciones = self.grafo.posiciones(i, j)
+            anterior = float(pesos[posiciones].min())
+            pesos[posiciones] = peso
+            # Cada reparación necesita el grafo tal como quedó después de ese cambio
+            intermedio = GrafoCSR(self.grafo.nombres, self.grafo.offsets, self.grafo.destinos, pesos.copy())
+            tabla.reparar(intermedio, i, j, anterior, peso)
+
+    def _descartar_filas_hitos(self):
+        for clave in [clave for clave in self._filas_heuristica if clave[1]]:
+            del self._filas_heuristica[clave]
+
+    def matriz(self, origenes, destinos, caminos=False, procesos=1):
+        """Distancias origen×destino por nombre de ciudad; ver ``matriz_distancias``"""
+        from matriz_distancias import muchos_a_muchos
+
+        ids_origenes = [self.id_ciudad(nombre) for nombre in origenes]
+        ids_destinos = [self.id_ciudad(nombre) for nombre in destinos]
+        matriz, rutas = muchos_a_muchos(self.grafo, ids_origenes, ids_destinos, caminos, procesos)
+        if rutas is not None:
+            nombres = self.grafo.nombres
+            rutas = [[None if ruta is None else [nombres[i] for i in ruta] for ruta in fila] for fila in rutas]
+        return matriz, rutas
+
+    @cached_property
+    def ubicaciones(self):
+        """``{nombre: (lat, lon)}`` de los nodos con coordenadas conocidas, para dibujarlos"""
+        return {nombre: (float(lat), float(lon))
+                for nombre, lat, lon in zip(self.grafo.nombres, self.latitudes, self.longitudes)
+                if math.isfinite(lat) and math.isfinite(lon)}
+
+    def ciudad_mas_cercana(self, lat, lon):
+        """Nombre del nodo más cercano a un punto, con un índice espacial de grilla"""
+        if self._indice_espacial is None:
+            from indice_espacial import IndiceGrilla
+
+            self._indice_espacial = IndiceGrilla(self.latitudes, self.longitudes)
+        i = self._indice_espacial.mas_cercano(lat, lon)
+        return None if i is None else self.grafo.nombres[i]
+
+    @cached_property
+    def _radianes(self):
+        """Latitudes, longitudes y cosenos de latitud como listas, para la heurística nodo a nodo"""
+        lat = np.radians(self.latitudes)
+        return lat.tolist(), np.radians(self.longitudes).tolist(), np.cos(lat).tolist()
+
+    def heuristica(self, i, j):
+        """Cota inferior en km (gran círculo) entre las ciudades ``i`` y ``j``"""
+        if self.matriz_heuristica is not None:
+            return float(self.matriz_heuristica[i, j])
+        return self._cota_gran_circulo(j)(i)
+
+    def _cota_gran_circulo(self, nodo):
+        """Función ``v -> haversine_km(v, nodo)`` con escalares de Python; 0 sin coordenadas"""
+        lat, lon, cos_lat = self._radianes
+        lat_n, lon_n, cos_n = lat[nodo], lon[nodo], cos_lat[nodo]
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        diametro = 2 * RADIO_TIERRA_KM
+
+        def cota(v):
+            a = sin((lat[v] - lat_n) / 2) ** 2 + cos_lat[v] * cos_n * sin((lon[v] - lon_n) / 2) ** 2
+            # ``a`` es NaN (y la comparación falsa) si falta alguna coordenada
+            return diametro * asin(sqrt(min(a, 1.0))) if a >= 0.0 else 0.0
+        return cota
+
+    def _fila_heuristica(self, nodo, hitos=False, hacia=True):
+        """Cotas de la distancia hacia ``nodo`` (o desde él), indexables por id de nodo.
+
+        Sin matriz, cada cota se calcula la primera vez que la búsqueda la pide
+        (ver ``CotasPerezosas``). Con ``hitos`` se toma además el máximo con
+        las cotas ALT, que también se evalúan nodo a nodo.
+        """
+        clave = (nodo, hitos, hacia)
+        fila = self._filas_heuristica.get(clave)
+        if fila is not None:
+            self._filas_heuristica.move_to_end(clave)
+            self.aciertos_heuristica += 1
+            return fila
+        self.fallos_heuristica += 1
+        if self.matriz_heuristica is not None:
+            fila = self.matriz_heuristica[nodo].tolist()
+            gran_circulo = fila.__getitem__
+        else:
+            gran_circulo = self._cota_gran_circulo(nodo)
+            fila = CotasPerezosas(gran_circulo)
+        if hitos:
+            alt = self.hitos.cota_hacia(nodo) if hacia else self.hitos.cota_desde(nodo)
+            fila = CotasPerezosas(lambda v: max(gran_circulo(v), alt(v)))
+        self._filas_heuristica[clave] = fila
+        if len(self._filas_heuristica) > self._capacidad_filas:
+            self._filas_heuristica.popitem(last=False)
+        return fila
+
+    def _voraz(self, inicio, meta):
+        """Búsqueda voraz guiada solo por la heurística"""
+        heuristica = self._fila_heuristica(meta)
+        vecinos = self.grafo.vecinos
+        contador = 0
+        cola = [(0, contador, inicio)]
+        costo = {inicio: 0}
+        padres = {inicio: None}
+        visitados = set()
+
+        while cola:
+            _, _, actual = heapq.heappop(cola)
+
+            if actual == meta:
+                return _reconstruir(padres, meta), costo[meta], len(visitados), contador
+
+            if actual in visitados:
+                continue
+            visitados.add(actual)
+
+            for vecino, dist in vecinos(actual):
+                # El primer padre descubierto es el que saldría primero de la cola
+                if vecino not in padres and dist < math.inf:
+                    padres[vecino] = actual
+                    costo[vecino] = costo[actual] + dist
+                    contador += 1
+                    heapq.heappush(cola, (heuristica[vecino], contador, vecino))
+
+        return None
+
+    def _a_estrella(self, inicio, meta):
+        return self._busqueda_a_estrella(inicio, meta, self._fila_heuristica(meta))
+
+    def _dijkstra(self, inicio, meta):
+        # A* con heurística nula: la referencia exacta contra la que se comparan los demás
+        return self._busqueda_a_estrella(inicio, meta, defaultdict(float))
+
+    def _alt(self, inicio, meta):
+        return self._busqueda_a_estrella(inicio, meta, self._fila_heuristica(meta, hitos=True))
+
+    def _bidireccional(self, inicio, meta):
+        return self._busqueda_bidireccional(
+            inicio, meta, self._fila_heuristica(meta), self._fila_heuristica(inicio, hacia=False))
+
+    def _alt_bidireccional(self, inicio, meta):
+        return self._busqueda_bidireccional(
+            inicio, meta, self._fila_heuristica(meta, hitos=True),
+            self._fila_heuristica(inicio, hitos=True, hacia=False))
+
+    def _busqueda_a_estrella(self, inicio, meta, heuristica):
+        """Búsqueda A* con mejor g por nodo y punteros a padre"""
+        vecinos = self.grafo.vecinos
+        contador = 0
+        cola = [(0, contador, 0, inicio)]
+        mejor_g = {inicio: 0}
+        padres = {inicio: None}
+        expandidos = 0
+
+        while cola:
+            _, _, costo_real, actual = heapq.heappop(cola)
+
+            # Entrada dominada: ya se encontró un camino más corto a este nodo
+            if costo_real > mejor_g[actual]:
+                continue
+
+            if actual == meta:
+                return _reconstruir(padres, meta), costo_real, expandidos, contador
+            expandidos += 1
+
+            for vecino, dist in vecinos(actual):
+                nuevo_costo = costo_real + dist
+                if nuevo_costo < mejor_g.get(vecino, math.inf):
+                    mejor_g[vecino] = nuevo_costo
+                    padres[vecino] = actual
+                    contador += 1
+                    heapq.heappush(cola, (nuevo_costo + heuristica[vecino], contador, nuevo_costo, vecino))
+
+        return None
+
+    def _busqueda_bidireccional(self, inicio, meta, hacia_meta, desde_inicio):
+        """A* bidireccional con potenciales promediados.
+
+        Ambas búsquedas usan el potencial ``p(v) = (hacia_meta[v] - desde_inicio[v]) / 2``
+        (la de atrás con signo contrario), que es consistente en los dos
+        sentidos; así puede pararse cuando la suma de los topes de ambas
+        colas alcanza el mejor camino encontrado.
+        """
+        if inicio == meta:
+            return [inicio], 0.0, 0, 0
+        potencial = CotasPerezosas(lambda v: (hacia_meta[v] - desde_inicio[v]) / 2)
+        vecinos = (self.grafo.vecinos, self.grafo.invertido.vecinos)
+        signo = (1, -1)
+        mejor_g = ({inicio: 0}, {meta: 0})
+        padres = ({inicio: None}, {meta: None})
+        colas = ([(potencial[inicio], 0, 0, inicio)], [(-potencial[meta], 0, 0, meta)])
+        contador = 0
+        expandidos = 0
+        mejor, encuentro = math.inf, None
+
+        while colas[0] and colas[1]:
+            if colas[0][0][0] + colas[1][0][0] >= mejor:
+                break
+            # Se avanza el lado con el tope más bajo
+            lado = 0 if colas[0][0][0] <= colas[1][0][0] else 1
+            _, _, costo_real, actual = heapq.heappop(colas[lado])
+            if costo_real > mejor_g[lado][actual]:
+                continue
+            expandidos += 1
+
+            g_lado, g_otro = mejor_g[lado], mejor_g[1 - lado]
+            for vecino, dist in vecinos[lado](actual):
+                nuevo_costo = costo_real + dist
+                if nuevo_costo < g_lado.get(vecino, math.inf):
+                    g_lado[vecino] = nuevo_costo
+                    padres[lado][vecino] = actual
+                    contador += 1
+                    heapq.heappush(colas[lado], (nuevo_costo + signo[lado] * potencial[vecino], contador, nuevo_costo, vecino))
+                    if vecino in g_otro and nuevo_costo + g_otro[vecino] < mejor:
+                        mejor, encuentro = nuevo_costo + g_otro[vecino], vecino
+
+        if encuentro is None:
+            return None
+        # Mitad hacia adelante desde el inicio y mitad hacia atrás desde la meta
+        camino = _reconstruir(padres[0], encuentro)
+        nodo = padres[1][encuentro]
+        while nodo is not None:
+            camino.append(nodo)
+            nodo = padres[1][nodo]
+        return camino, mejor, expandidos, contador
+
+    def _jerarquia(self, inicio, meta):
+        # Tras un cambio de pesos los atajos pueden estar mal: se contrae de nuevo, una vez
+        if self._jerarquia_vencida:
+            from jerarquia import Jerarquia, calcular_jerarquia
+
+            with self._bloqueo_pesos:
+                self.jerarquia = Jerarquia(calcular_jerarquia(self.grafo), huella=self.huella_vigente)
+                self._jerarquia_vencida = False
+        return self.jerarquia.consulta(inicio, meta)
+
+    def _tabla(self, inicio, meta):
+        """Respuesta directa desde la tabla precalculada"""
+        camino = self.tabla.camino(inicio, meta)
+        if camino is None:
+            return None
+        return camino, self.tabla.distancia(inicio, meta), 0, 0
+
+class CotasPerezosas(dict):
+    """Cotas por id de nodo que se calculan (y se guardan) la primera vez que se piden"""
+
+    def __init__(self, calcular):
+        super().__init__()
+        self.calcular = calcular
+
+    def __missing__(self, nodo):
+        cota = self[nodo] = self.calcular(nodo)
+        return cota
+
+def distancias_desde(grafo, origen, metas=None, con_padres=False):
+    """Dijkstra desde ``origen`` a todos los nodos; ``inf`` donde no hay camino.
+
+    Con ``metas`` (ids) se detiene en cuanto todas están asentadas. Con
+    ``con_padres`` devuelve ``(distancias, padres)``, con -1 como padre del
+    origen y de los nodos no alcanzados.
+    """
+    offsets, destinos, pesos = grafo._offsets, grafo._destinos, grafo._pesos
+    dist = [math.inf] * grafo.n
+    padres = [-1] * grafo.n
+    dist[origen] = 0.0
+    pendientes = None if metas is None else set(metas)
+    cola = [(0.0, origen)]
+    while cola:
+        d, actual = heapq.heappop(cola)
+        if d > dist[actual]:
+            continue
+        if pendientes is not None:
+            pendientes.discard(actual)
+            if not pendientes:
+                break
+        for k in range(offsets[actual], offsets[actual + 1]):
+            vecino = destinos[k]
+            nueva = d + pesos[k]
+            if nueva < dist[vecino]:
+                dist[vecino] = nueva
+                padres[vecino] = actual
+                heapq.heappush(cola, (nueva, vecino))
+    if con_padres:
+        return np.array(dist), padres
+    return np.array(dist)
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo en km; acepta escalares o arreglos con broadcasting"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def matriz_haversine(latitudes, longitudes):
+    """Matriz n×n de distancias de gran círculo en km, calculada en una sola pasada.
+
+    Es admisible y consistente para A*: ninguna carretera es más corta que
+    el gran círculo entre sus extremos. Las ciudades sin coordenadas
+    (NaN) reciben heurística 0.
+    """
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    matriz = haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+    return np.ascontiguousarray(np.nan_to_num(matriz, nan=0.0))
+
+def _reconstruir(padres, meta):
+    """Reconstruye el camino siguiendo los punteros a padre desde la meta"""
+    camino = []
+    nodo = meta
+    while nodo is not None:
+        camino.append(nodo)
+        nodo = padres[nodo]
+    camino.reverse()
+    return camino
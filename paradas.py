@@ -0,0 +1,217 @@
+"""Rutas con varias paradas: el mejor orden para visitar un conjunto de ciudades.
+
+La matriz de distancias entre origen y paradas se calcula una sola vez con
+``MotorRutas.matriz`` (junto con los caminos). Hasta ``LIMITE_EXACTO``
+paradas el orden se resuelve exacto con programación dinámica sobre
+subconjuntos (Held–Karp); con más, vecino más cercano seguido de 2-opt y
+Or-opt mientras quede presupuesto de tiempo. El orden se expande luego a la
+secuencia completa de ciudades para dibujarla como una ruta normal.
+
+Uso: ``python paradas.py --origen Bogotá --paradas Cali,Pasto,Neiva [--regreso] [--presupuesto 1.0]``
+o ``python paradas.py --comparar 20`` para medir la heurística contra el exacto.
+"""
+import argparse
+import math
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+# Paradas hasta las que se usa Held–Karp: O(2^k · k²)
+LIMITE_EXACTO = 12
+# Reinicios seguidos sin mejorar tras los que la heurística se da por terminada
+REINICIOS_SIN_MEJORA = 50
+
+@dataclass
+class ResultadoParadas:
+    """Orden de visita (con el origen al inicio) y la ruta completa que lo recorre"""
+    orden: list
+    ruta: list
+    distancia: float
+    metodo: str
+    tramos: list
+
+def _costo(distancias, orden, regreso):
+    total = sum(distancias[a, b] for a, b in zip(orden, orden[1:]))
+    return total + distancias[orden[-1], orden[0]] if regreso else total
+
+def orden_exacto(distancias, regreso=False):
+    """Held–Karp sobre la matriz (el nodo 0 es el origen); orden de índices, o ``None`` sin recorrido finito"""
+    k = len(distancias) - 1
+    if k == 0:
+        return [0]
+    completo = (1 << k) - 1
+    # costo[mascara, j]: mejor camino desde el origen por las paradas de ``mascara``, terminando en la j
+    costo = np.full((completo + 1, k), math.inf)
+    padre = np.full((completo + 1, k), -1, dtype=np.int64)
+    entre = distancias[1:, 1:]
+    costo[1 << np.arange(k), np.arange(k)] = distancias[0, 1:]
+    for mascara in range(1, completo + 1):
+        fila = costo[mascara]
+        if not np.isfinite(fila).any():
+            continue
+        libres = [j for j in range(k) if not mascara >> j & 1]
+        if not libres:
+            continue
+        # Extiende cada final j de ``mascara`` hacia cada parada libre
+        candidatos = fila[:, None] + entre[:, libres]
+        mejores = candidatos.argmin(axis=0)
+        for columna, j in enumerate(libres):
+            siguiente = mascara | 1 << j
+            valor = candidatos[mejores[columna], columna]
+            if valor < costo[siguiente, j]:
+                costo[siguiente, j] = valor
+                padre[siguiente, j] = mejores[columna]
+
+    cierre = distancias[1:, 0] if regreso else np.zeros(k)
+    final = int(np.argmin(costo[completo] + cierre))
+    if not math.isfinite(costo[completo, final] + cierre[final]):
+        return None
+    orden = []
+    mascara = completo
+    while final >= 0:
+        orden.append(final + 1)
+        final, mascara = int(padre[mascara, final]), mascara & ~(1 << final)
+    return [0] + orden[::-1]
+
+def _mejora_local(distancias, orden, regreso, limite):
+    """2-opt y Or-opt hasta un óptimo local o hasta ``limite``; devuelve (orden, costo)"""
+    n = len(orden)
+    mejor = _costo(distancias, orden, regreso)
+    mejorado = True
+    while mejorado and time.perf_counter() < limite:
+        mejorado = False
+        # 2-opt: invierte el tramo orden[i..j] (el origen queda fijo)
+        for i in range(1, n - 1):
+            for j in range(i + 1, n):
+                candidato = orden[:i] + orden[i:j + 1][::-1] + orden[j + 1:]
+                costo = _costo(distancias, candidato, regreso)
+                if costo < mejor - 1e-9:
+                    orden, mejor, mejorado = candidato, costo, True
+            if time.perf_counter() >= limite:
+                break
+        # Or-opt: mueve un bloque de 1 a 3 paradas a otra posición
+        for largo in (1, 2, 3):
+            for i in range(1, n - largo + 1):
+                bloque = orden[i:i + largo]
+                resto = orden[:i] + orden[i + largo:]
+                for posicion in range(1, len(resto) + 1):
+                    if posicion == i:
+                        continue
+                    candidato = resto[:posicion] + bloque + resto[posicion:]
+                    costo = _costo(distancias, candidato, regreso)
+                    if costo < mejor - 1e-9:
+                        orden, mejor, mejorado = candidato, costo, True
+                        break
+            if time.perf_counter() >= limite:
+                break
+    return orden, mejor
+
+def orden_heuristico(distancias, regreso=False, presupuesto_s=1.0, semilla=0):
+    """Vecino más cercano desde el origen y mejora local (2-opt, Or-opt).
+
+    El presupuesto que sobra tras el primer óptimo local se usa en
+    reinicios: se perturba el mejor orden (double-bridge) y se vuelve a mejorar,
+    hasta ``REINICIOS_SIN_MEJORA`` reinicios seguidos sin ganancia.
+    """
+    limite = time.perf_counter() + presupuesto_s
+    n = len(distancias)
+    orden = [0]
+    pendientes = set(range(1, n))
+    while pendientes:
+        cercano = min(pendientes, key=lambda j: distancias[orden[-1], j])
+        orden.append(cercano)
+        pendientes.remove(cercano)
+
+    mejor_orden, mejor = _mejora_local(distancias, orden, regreso, limite)
+    rng = np.random.default_rng(semilla)
+    sin_mejora = 0
+    while n > 8 and sin_mejora < REINICIOS_SIN_MEJORA and time.perf_counter() < limite:
+        # Double-bridge: corta en tres puntos y reordena los tramos; 2-opt no lo deshace fácil
+        a, b, c = sorted(rng.choice(np.arange(2, n), 3, replace=False).tolist())
+        perturbado = mejor_orden[:a] + mejor_orden[b:c] + mejor_orden[a:b] + mejor_orden[c:]
+        orden, costo = _mejora_local(distancias, perturbado, regreso, limite)
+        if costo < mejor - 1e-9:
+            mejor_orden, mejor, sin_mejora = orden, costo, 0
+        else:
+            sin_mejora += 1
+    return mejor_orden
+
+def optimizar(motor, origen, paradas, regreso=False, presupuesto_s=1.0, metricas=None):
+    """Mejor orden para visitar ``paradas`` desde ``origen``; ``None`` si alguna es inalcanzable"""
+    from metricas import medir
+
+    paradas = [p for p in dict.fromkeys(paradas) if p != origen]
+    nombres = [origen] + paradas
+    with medir(metricas, 'matriz'):
+        distancias, caminos = motor.matriz(nombres, nombres, caminos=True)
+    with medir(metricas, 'orden'):
+        if len(paradas) <= LIMITE_EXACTO:
+            orden, metodo = orden_exacto(distancias, regreso), 'exacto'
+        else:
+            orden, metodo = orden_heuristico(distancias, regreso, presupuesto_s), 'heurístico'
+    if orden is None:
+        return None
+    if regreso:
+        orden = orden + [0]
+    distancia = _costo(distancias, orden, False)
+    if not math.isfinite(distancia):
+        return None
+
+    ruta = [origen]
+    tramos = []
+    for a, b in zip(orden, orden[1:]):
+        ruta.extend(caminos[a][b][1:])
+        tramos.append(float(distancias[a, b]))
+    if metricas is not None:
+        metricas.contar('paradas', len(paradas))
+    return ResultadoParadas([nombres[i] for i in orden], ruta, float(distancia), metodo, tramos)
+
+def comparar(motor, instancias=20, paradas=9, semilla=0, presupuesto_s=0.2):
+    """Brecha de la heurística frente al exacto sobre instancias al azar entre capitales"""
+    rng = np.random.default_rng(semilla)
+    # Solo capitales alcanzables entre sí (las islas y las de la selva no tienen vías)
+    todas, _ = motor.matriz(motor.capitales, motor.capitales)
+    centro = int(np.isfinite(todas).sum(axis=1).argmax())
+    alcanzables = [c for c, ida, vuelta in zip(motor.capitales, todas[centro], todas[:, centro])
+                   if np.isfinite(ida) and np.isfinite(vuelta)]
+    brechas = []
+    for _ in range(instancias):
+        ciudades = [alcanzables[i] for i in rng.choice(len(alcanzables), paradas + 1, replace=False)]
+        distancias, _ = motor.matriz(ciudades, ciudades)
+        regreso = bool(rng.integers(2))
+        exacto = _costo(distancias, orden_exacto(distancias, regreso), regreso)
+        heuristico = _costo(distancias, orden_heuristico(distancias, regreso, presupuesto_s), regreso)
+        if heuristico < exacto - 1e-6:
+            raise AssertionError(f"La heurística ({heuristico}) mejora al exacto ({exacto}) en {ciudades}")
+        brechas.append((heuristico - exacto) / exacto * 100)
+    brechas = np.array(brechas)
+    print(f"{len(brechas)} instancias de {paradas} paradas: brecha media {brechas.mean():.2f}%, "
+          f"máxima {brechas.max():.2f}%, óptimas {int((brechas < 1e-6).sum())}")
+
+if __name__ == '__main__':
+    from motor_rutas import MotorRutas
+
+    parser = argparse.ArgumentParser(description="Orden óptimo de visita para una ruta con varias paradas")
+    parser.add_argument('--json', default='conexiones.json')
+    parser.add_argument('--origen', default='Bogotá')
+    parser.add_argument('--paradas', default='', help="Ciudades separadas por comas")
+    parser.add_argument('--regreso', action='store_true', help="Volver al origen al final")
+    parser.add_argument('--presupuesto', type=float, default=1.0, help="Segundos para la heurística")
+    parser.add_argument('--comparar', type=int, default=0, metavar='INSTANCIAS',
+                        help="Comparar heurística y exacto sobre instancias al azar")
+    args = parser.parse_args()
+
+    motor = MotorRutas(args.json)
+    if args.comparar:
+        comparar(motor, args.comparar, presupuesto_s=args.presupuesto)
+    if args.paradas:
+        inicio = time.perf_counter()
+        resultado = optimizar(motor, args.origen, args.paradas.split(','), args.regreso, args.presupuesto)
+        ms = (time.perf_counter() - inicio) * 1000
+        if resultado is None:
+            print("Alguna parada es inalcanzable")
+        else:
+            print(f"Orden ({resultado.metodo}, {ms:.1f} ms): {' → '.join(resultado.orden)}")
+            print(f"Ruta: {' → '.join(resultado.ruta)}")
+            print(f"Distancia: {resultado.distancia:.1f} km")
@@ -0,0 +1,221 @@
+"""Renderizado del mapa directamente sobre una imagen PIL, sin navegador.
+
+Proyecta las coordenadas con Web Mercator (la misma proyección de Leaflet)
+y dibuja conexiones, marcadores y la ruta resaltada. Solo depende de PIL.
+"""
+import math
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+from motor_rutas import coordenadas
+
+# [[sur, oeste], [norte, este]] usados por _ajustar_vista_colombia
+LIMITES_COLOMBIA = [[-4.3, -79.2], [12.6, -66.8]]
+# Límites máximos permitidos en la vista de una ruta
+LIMITES_MAXIMOS = [[-4.5, -82.0], [13.0, -66.0]]
+
+def limites_ruta(puntos_ruta):
+    """Límites [[sur, oeste], [norte, este]] que muestran la ruta completa sin cortes"""
+    lats = [p[0] for p in puntos_ruta]
+    lons = [p[1] for p in puntos_ruta]
+
+    min_lat, max_lat = min(lats), max(lats)
+    min_lon, max_lon = min(lons), max(lons)
+
+    # Extensión mínima para evitar zoom excesivo
+    min_span = 3.0
+    lat_span = max(max_lat - min_lat, min_span)
+    lon_span = max(max_lon - min_lon, min_span)
+
+    # Padding dinámico del 35% de la extensión
+    padding_factor = 0.35
+    (lim_sur, lim_oeste), (lim_norte, lim_este) = LIMITES_MAXIMOS
+    south = max(min_lat - lat_span * padding_factor, lim_sur)
+    north = min(max_lat + lat_span * padding_factor, lim_norte)
+    west = max(min_lon - lon_span * padding_factor, lim_oeste)
+    east = min(max_lon + lon_span * padding_factor, lim_este)
+
+    # Ajustar relación de aspecto a la ventana cuadrada
+    window_aspect = 1.0
+    route_aspect = lon_span / lat_span
+    if route_aspect > window_aspect:
+        delta_lat = (lon_span / window_aspect - lat_span) / 2
+        south = max(south - delta_lat, lim_sur)
+        north = min(north + delta_lat, lim_norte)
+    else:
+        delta_lon = (lat_span * window_aspect - lon_span) / 2
+        west = max(west - delta_lon, lim_oeste)
+        east = min(east + delta_lon, lim_este)
+
+    return [[south, west], [north, east]]
+
+def _mercator_y(lat):
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+class Proyeccion:
+    """Convierte lat/lon a píxeles ajustando unos límites al lienzo (como ``fit_bounds``)"""
+
+    def __init__(self, limites, ancho, alto, padding=20):
+        (sur, oeste), (norte, este) = limites
+        x0, x1 = math.radians(oeste), math.radians(este)
+        y0, y1 = _mercator_y(sur), _mercator_y(norte)
+        self.escala = min((ancho - 2 * padding) / (x1 - x0), (alto - 2 * padding) / (y1 - y0))
+        self.centro_x = (x0 + x1) / 2
+        self.centro_y = (y0 + y1) / 2
+        self.ancho = ancho
+        self.alto = alto
+
+    def a_pixel(self, lat, lon):
+        x = self.ancho / 2 + (math.radians(lon) - self.centro_x) * self.escala
+        y = self.alto / 2 - (_mercator_y(lat) - self.centro_y) * self.escala
+        return x, y
+
+    def a_latlon(self, x, y):
+        lon = math.degrees((x - self.ancho / 2) / self.escala + self.centro_x)
+        merc = (self.alto / 2 - y) / self.escala + self.centro_y
+        lat = math.degrees(2 * math.atan(math.exp(merc)) - math.pi / 2)
+        return lat, lon
+
+def _fuente(tamano):
+    """Fuente TrueType con tildes si está disponible; si no, la de PIL"""
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', tamano)
+    except OSError:
+        pass
+    try:
+        return ImageFont.load_default(size=tamano)
+    except TypeError:
+        # Pillow < 10.1 solo ofrece la fuente bitmap de tamaño fijo
+        return ImageFont.load_default()
+
+def _rgba(color, opacidad):
+    color = color.lstrip('#')
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4)) + (round(255 * opacidad),)
+
+class RenderizadorRaster:
+    """Dibuja el mapa base y las rutas en imágenes de ``ancho`` x ``alto`` píxeles.
+
+    Se dibuja a ``supermuestreo`` veces el tamaño final y se reduce al final
+    para suavizar líneas y círculos.
+    """
+
+    def __init__(self, datos, ancho=800, alto=800, supermuestreo=2, ubicaciones=None):
+        self.datos = datos
+        # ``{nombre: (lat, lon)}`` de lo que se dibuja; por omisión, las capitales
+        self.ubicaciones = coordenadas if ubicaciones is None else ubicaciones
+        self.ancho = ancho
+        self.alto = alto
+        self.supermuestreo = supermuestreo
+        self.fuente = _fuente(12 * supermuestreo)
+        # Capas base ya dibujadas, por (límites, estilo); la red no cambia entre consultas
+        self.max_capas_base = 32
+        self._capas_base = OrderedDict()
+        self._imagen_base = None
+        # Pares (ciudad, destino) de vías cerradas, que se dibujan aparte
+        self.cerradas = frozenset()
+
+    def _aristas(self):
+        for ciudad, conexiones in self.datos['conexiones'].items():
+            if ciudad in self.ubicaciones:
+                for destino in conexiones:
+                    if destino in self.ubicaciones:
+                        yield ciudad, destino
+
+    def _geometria(self, limites):
+        s = self.supermuestreo
+        return limites, self.ancho * s, self.alto * s, 20 * s
+
+    def _lienzo(self, limites):
+        _, ancho, alto, padding = self._geometria(limites)
+        img = Image.new('RGBA', (ancho, alto), (255, 255, 255, 255))
+        return img, Proyeccion(limites, ancho, alto, padding=padding)
+
+    def _finalizar(self, img):
+        if self.supermuestreo > 1:
+            # Promedio por bloques: mucho más barato que LANCZOS con factor entero
+            img = img.reduce(self.supermuestreo)
+        return img.convert('RGB')
+
+    def _dibujar_base(self, img, proyeccion, grosor, radio, opacidad):
+        """Conexiones y marcadores de todas las ciudades"""
+        s = self.supermuestreo
+        capa = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(capa)
+        color_linea = _rgba('#E67E22', opacidad)
+        cerradas = []
+        for ciudad, destino in self._aristas():
+            extremos = [proyeccion.a_pixel(*self.ubicaciones[ciudad]), proyeccion.a_pixel(*self.ubicaciones[destino])]
+            if (ciudad, destino) in self.cerradas:
+                cerradas.append(extremos)
+            else:
+                draw.line(extremos, fill=color_linea, width=round(grosor * s))
+        # Encima de las abiertas: línea roja delgada con una cruz en el medio
+        color_cerrada = _rgba('#C0392B', max(opacidad, 0.9))
+        for (x1, y1), (x2, y2) in cerradas:
+            draw.line([(x1, y1), (x2, y2)], fill=color_cerrada, width=max(1, round(grosor * s / 2)))
+            xm, ym, brazo = (x1 + x2) / 2, (y1 + y2) / 2, 6 * s
+            for dx in (-brazo, brazo):
+                draw.line([(xm - dx, ym - brazo), (xm + dx, ym + brazo)], fill=color_cerrada, width=round(2 * s))
+        color_marcador = _rgba('#E74C3C', opacidad)
+        for lat, lon in self.ubicaciones.values():
+            self._circulo(draw, proyeccion.a_pixel(lat, lon), radio * s, color_marcador)
+        img.alpha_composite(capa)
+
+    @staticmethod
+    def _circulo(draw, centro, radio, relleno, borde=None, grosor=0):
+        x, y = centro
+        draw.ellipse([x - radio, y - radio, x + radio, y + radio], fill=relleno, outline=borde, width=grosor)
+
+    def _capa_base(self, limites, grosor, radio, opacidad):
+        """Capa base supermuestreada para unos límites, dibujada una sola vez"""
+        clave = (tuple(map(tuple, limites)), grosor, radio, opacidad)
+        capa = self._capas_base.get(clave)
+        if capa is not None:
+            self._capas_base.move_to_end(clave)
+            return capa, Proyeccion(*self._geometria(limites))
+        img, proyeccion = self._lienzo(limites)
+        self._dibujar_base(img, proyeccion, grosor, radio, opacidad)
+        self._capas_base[clave] = img
+        if len(self._capas_base) > self.max_capas_base:
+            self._capas_base.popitem(last=False)
+        return img, proyeccion
+
+    def limpiar_cache(self):
+        """Descarta las capas base (p. ej. si cambian las conexiones)"""
+        self._capas_base.clear()
+        self._imagen_base = None
+
+    def marcar_cerradas(self, cerradas):
+        """Dibuja ``cerradas`` (pares ciudad, destino) como vías cerradas desde el próximo render"""
+        cerradas = frozenset(cerradas)
+        if cerradas != self.cerradas:
+            self.cerradas = cerradas
+            self.limpiar_cache()
+
+    def render_base(self):
+        """Mapa completo de Colombia con todas las conexiones"""
+        if self._imagen_base is None:
+            capa, _ = self._capa_base(LIMITES_COLOMBIA, grosor=4.5, radio=7.5, opacidad=1.0)
+            self._imagen_base = self._finalizar(capa)
+        return self._imagen_base
+
+    def render_ruta(self, ruta):
+        """Mapa enfocado en la ruta: solo la ruta se dibuja sobre la capa base guardada"""
+        puntos_ruta = [self.ubicaciones[ciudad] for ciudad in ruta if ciudad in self.ubicaciones]
+        capa, proyeccion = self._capa_base(limites_ruta(puntos_ruta), grosor=3.5, radio=5, opacidad=0.7)
+        img = capa.copy()
+        self._dibujar_ruta(img, proyeccion, ruta)
+        return self._finalizar(img)
+
+    def _dibujar_ruta(self, img, proyeccion, ruta):
+        """Polilínea de la ruta, marcadores resaltados y nombres de las ciudades"""
+        s = self.supermuestreo
+        draw = ImageDraw.Draw(img)
+        pixeles = [proyeccion.a_pixel(*self.ubicaciones[ciudad]) for ciudad in ruta if ciudad in self.ubicaciones]
+        draw.line(pixeles, fill=_rgba('#2980B9', 1.0), width=round(6.5 * s), joint='curve')
+        verde = _rgba('#27AE60', 1.0)
+        for x, y in pixeles:
+            self._circulo(draw, (x, y), 9 * s, verde)
+        for ciudad, (x, y) in zip([c for c in ruta if c in self.ubicaciones], pixeles):
+            draw.text((x + 11 * s, y - 6 * s), ciudad, fill=(0, 0, 0, 255), font=self.fuente)
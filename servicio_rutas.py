@@ -0,0 +1,256 @@
+"""Servicio HTTP de rutas sin Tk ni Chrome, con ``asyncio`` de la biblioteca estándar.
+
+Endpoints (GET, respuestas JSON):
+
+- ``/route?from=Cali&to=Pasto&algo=voraz|astar`` (o cualquier algoritmo del motor)
+- ``/matrix?from=Cali,Pasto&to=Bogotá,Neiva[&paths=1]``
+- ``/stats``: percentiles de latencia, contadores de la caché y solicitudes agrupadas
+
+Las respuestas se guardan en una LRU compartida por todas las conexiones, y
+las solicitudes idénticas que llegan mientras otra igual está en curso
+esperan ese mismo resultado en lugar de repetir la búsqueda. Con
+``--trabajadores N`` se bifurcan N procesos que aceptan sobre el mismo
+socket (cada uno con su propia caché).
+
+Uso: ``python servicio_rutas.py [--host 127.0.0.1] [--puerto 8080] [--trabajadores 1] [--cache 4096]``
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from cache_rutas import CacheRutas
+from motor_rutas import MotorRutas
+
+# Nombres públicos de la API -> algoritmos del motor
+ALIAS_ALGORITMOS = {'voraz': 'voraz', 'astar': 'a_estrella'}
+_ESTADOS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            500: 'Internal Server Error'}
+
+class ErrorSolicitud(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+def percentiles(valores, cuantiles=(50, 90, 99)):
+    """Percentiles de una secuencia de latencias (ms); vacío si no hay datos"""
+    if not len(valores):
+        return {}
+    arreglo = np.asarray(valores, dtype=np.float64)
+    resultado = {f'p{q}': round(float(np.percentile(arreglo, q)), 3) for q in cuantiles}
+    resultado['max'] = round(float(arreglo.max()), 3)
+    return resultado
+
+class ServicioRutas:
+    """Atiende las solicitudes HTTP sobre un ``MotorRutas`` ya cargado"""
+
+    def __init__(self, motor, capacidad_cache=4096, muestras_latencia=10000):
+        self.motor = motor
+        self.cache = CacheRutas(motor.huella, capacidad=capacidad_cache)
+        self.latencias = deque(maxlen=muestras_latencia)
+        self.solicitudes = 0
+        self.agrupadas = 0
+        self._en_curso = {}
+        # Un solo hilo: el motor no se comparte entre hilos y el bucle nunca se bloquea
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='busqueda')
+
+    async def _resolver(self, clave, funcion, *args):
+        """Respuesta desde la caché, desde una solicitud idéntica en curso o calculada"""
+        entrada = self.cache.obtener(clave)
+        if entrada is not None:
+            return entrada[0]
+        futuro = self._en_curso.get(clave)
+        if futuro is not None:
+            self.agrupadas += 1
+            return await asyncio.shield(futuro)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_curso[clave] = futuro
+        try:
+            respuesta = await asyncio.get_running_loop().run_in_executor(self._ejecutor, funcion, *args)
+        except Exception as error:
+            futuro.set_exception(error)
+            futuro.exception()  # Marcada como leída aunque nadie más la espere
+            raise
+        finally:
+            del self._en_curso[clave]
+        self.cache.guardar(clave, respuesta, None)
+        futuro.set_result(respuesta)
+        return respuesta
+
+    def _ciudad(self, nombre):
+        if nombre not in self.motor.grafo.indice:
+            raise ErrorSolicitud(400, f"Ciudad desconocida: {nombre!r}")
+        return nombre
+
+    def _parametro(self, consulta, nombre):
+        valores = consulta.get(nombre)
+        if not valores or not valores[0]:
+            raise ErrorSolicitud(400, f"Falta el parámetro '{nombre}'")
+        return valores[0]
+
+    def _ruta(self, origen, destino, algoritmo):
+        resultado = self.motor.ruta(origen, destino, algoritmo)
+        if resultado is None:
+            return 404, {'error': "No se encontró ruta", 'from': origen, 'to': destino}
+        return 200, {'from': origen, 'to': destino, 'algo': algoritmo, 'route': resultado.ruta,
+                     'distance': resultado.distancia, 'expanded': resultado.expandidos}
+
+    def _matriz(self, origenes, destinos, caminos):
+        matriz, rutas = self.motor.matriz(origenes, destinos, caminos=caminos, procesos=1)
+        cuerpo = {'from': origenes, 'to': destinos,
+                  'distances': [[float(d) if np.isfinite(d) else None for d in fila] for fila in matriz]}
+        if caminos:
+            cuerpo['routes'] = rutas
+        return 200, cuerpo
+
+    async def atender(self, metodo, objetivo):
+        """``(estado, cuerpo)`` para una solicitud ya separada en método y URL"""
+        if metodo != 'GET':
+            raise ErrorSolicitud(405, "Solo se admite GET")
+        url = urlsplit(objetivo)
+        consulta = parse_qs(url.query)
+
+        if url.path == '/route':
+            origen = self._ciudad(self._parametro(consulta, 'from'))
+            destino = self._ciudad(self._parametro(consulta, 'to'))
+            alias = consulta.get('algo', ['astar'])[0]
+            algoritmo = ALIAS_ALGORITMOS.get(alias, alias)
+            if algoritmo not in self.motor.algoritmos:
+                raise ErrorSolicitud(400, f"Algoritmo desconocido: {alias!r}")
+            return await self._resolver(('ruta', algoritmo, origen, destino), self._ruta, origen, destino, algoritmo)
+
+        if url.path == '/matrix':
+            origenes = tuple(self._ciudad(c) for c in self._parametro(consulta, 'from').split(','))
+            destinos = tuple(self._ciudad(c) for c in self._parametro(consulta, 'to').split(','))
+            caminos = consulta.get('paths', ['0'])[0] in ('1', 'true')
+            return await self._resolver(('matriz', origenes, destinos, caminos),
+                                        self._matriz, list(origenes), list(destinos), caminos)
+
+        if url.path == '/stats':
+            return 200, self.estadisticas()
+
+        raise ErrorSolicitud(404, f"Ruta desconocida: {url.path}")
+
+    def estadisticas(self):
+        return {'pid': os.getpid(), 'solicitudes': self.solicitudes, 'agrupadas': self.agrupadas,
+                'latencia_ms': percentiles(self.latencias), 'cache': self.cache.contadores()}
+
+    async def conexion(self, lector, escritor):
+        """Bucle HTTP/1.1 de una conexión, con keep-alive"""
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                inicio = time.perf_counter()
+                partes = linea.decode('latin-1').split()
+                cabeceras = {}
+                while True:
+                    cabecera = await lector.readline()
+                    if cabecera in (b'\r\n', b'\n', b''):
+                        break
+                    nombre, _, valor = cabecera.decode('latin-1').partition(':')
+                    cabeceras[nombre.strip().lower()] = valor.strip().lower()
+                try:
+                    largo = int(cabeceras.get('content-length') or 0)
+                except ValueError:
+                    largo = -1
+                # Un cuerpo (que no usamos) se descarta para no desincronizar la conexión
+                if largo > 0:
+                    await lector.readexactly(largo)
+
+                try:
+                    if largo < 0:
+                        raise ErrorSolicitud(400, "Content-Length inválido")
+                    if len(partes) != 3:
+                        raise ErrorSolicitud(400, "Línea de solicitud inválida")
+                    estado, cuerpo = await self.atender(partes[0], partes[1])
+                except ErrorSolicitud as error:
+                    estado, cuerpo = error.estado, {'error': str(error)}
+                except Exception:
+                    traceback.print_exc()
+                    estado, cuerpo = 500, {'error': "Error interno"}
+
+                # Con un largo inválido no se sabe dónde empieza la siguiente solicitud
+                seguir = (largo >= 0 and cabeceras.get('connection') != 'close'
+                          and (len(partes) < 3 or partes[2] != 'HTTP/1.0' or cabeceras.get('connection') == 'keep-alive'))
+                datos = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+                escritor.write(
+                    f"HTTP/1.1 {estado} {_ESTADOS.get(estado, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(datos)}\r\n"
+                    f"Connection: {'keep-alive' if seguir else 'close'}\r\n\r\n".encode('latin-1') + datos)
+                await escritor.drain()
+                self.solicitudes += 1
+                self.latencias.append((time.perf_counter() - inicio) * 1000)
+                if not seguir:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+async def _servir(servicio, sock):
+    servidor = await asyncio.start_server(servicio.conexion, sock=sock)
+    async with servidor:
+        await servidor.serve_forever()
+
+def _trabajador(motor, sock, capacidad_cache):
+    servicio = ServicioRutas(motor, capacidad_cache)
+    try:
+        asyncio.run(_servir(servicio, sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[{os.getpid()}] {json.dumps(servicio.estadisticas(), ensure_ascii=False)}", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP de rutas")
+    parser.add_argument('--json', default='conexiones.json')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8080)
+    parser.add_argument('--trabajadores', type=int, default=1, help="Procesos que atienden el mismo socket")
+    parser.add_argument('--cache', type=int, default=4096, help="Respuestas guardadas por proceso")
+    args = parser.parse_args()
+
+    # El grafo se carga antes de bifurcar: los procesos comparten las páginas mapeadas
+    motor = MotorRutas(args.json)
+    sock = socket.create_server((args.host, args.puerto))
+    sock.setblocking(False)
+    print(f"Sirviendo en http://{args.host}:{sock.getsockname()[1]} ({args.trabajadores} trabajador(es))", flush=True)
+
+    if args.trabajadores <= 1 or not hasattr(os, 'fork'):
+        _trabajador(motor, sock, args.cache)
+        return
+    hijos = []
+    for _ in range(args.trabajadores):
+        pid = os.fork()
+        if pid == 0:
+            _trabajador(motor, sock, args.cache)
+            os._exit(0)
+        hijos.append(pid)
+    # SIGTERM se trata como Ctrl+C; la señal puede llegar solo al padre, así que se reenvía
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for pid in hijos:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGINT)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+if __name__ == '__main__':
+    main()
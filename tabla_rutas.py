@@ -0,0 +1,138 @@
+"""Tabla de caminos mínimos entre todos los pares, persistida para mapearse en memoria.
+
+El archivo binario contiene la matriz de distancias y la de siguiente salto
+calculadas con Floyd–Warshall vectorizado. Se reconstruye solo cuando cambia
+la huella (SHA-256) de ``conexiones.json``.
+
+Uso: ``python tabla_rutas.py [conexiones.json]``
+"""
+import os
+import sys
+
+import numpy as np
+
+from formato_grafo import FormatoSecciones, cargar_o_construir
+
+# n, huella sha256 (32 bytes)
+FORMATO = FormatoSecciones(b'RUTASAP1', 1, 'I32s', 'tabla')
+
+def _secciones(n):
+    return [('dist', '<f8', (n, n)), ('siguiente', '<i4', (n, n))]
+
+def ruta_tabla_por_defecto(ruta_json):
+    """``conexiones.json`` -> ``conexiones.tabla``"""
+    return os.path.splitext(ruta_json)[0] + '.tabla'
+
+def floyd_warshall(grafo):
+    """Distancias y siguiente salto entre todos los pares de un ``GrafoCSR``"""
+    n = grafo.n
+    dist = np.full((n, n), np.inf, dtype=np.float64)
+    origenes = np.repeat(np.arange(n), np.diff(grafo.offsets))
+    # np.minimum.at conserva la arista más corta si hay aristas repetidas
+    np.minimum.at(dist, (origenes, grafo.destinos), grafo.pesos)
+    np.fill_diagonal(dist, 0.0)
+
+    siguiente = np.where(np.isfinite(dist), np.arange(n, dtype=np.int32)[None, :], -1).astype(np.int32)
+    for k in range(n):
+        nuevo = dist[:, k, None] + dist[None, k, :]
+        mejor = nuevo < dist
+        np.copyto(dist, nuevo, where=mejor)
+        np.copyto(siguiente, np.broadcast_to(siguiente[:, k, None], (n, n)), where=mejor)
+    return dist, siguiente
+
+def guardar_tabla(ruta_tabla, huella, dist, siguiente):
+    n = dist.shape[0]
+    FORMATO.escribir(ruta_tabla, (n, bytes.fromhex(huella)), _secciones(n), {'dist': dist, 'siguiente': siguiente})
+
+class TablaRutas:
+    """Vista de solo lectura, mapeada en memoria, sobre un archivo de tabla"""
+
+    def __init__(self, ruta_tabla):
+        n, huella = FORMATO.leer_cabecera(ruta_tabla)
+        self.ruta_tabla = ruta_tabla
+        self.n = n
+        self.huella = huella.hex()
+        vistas = FORMATO.mapear(ruta_tabla, _secciones(n))
+        self.dist = vistas['dist']
+        self.siguiente = vistas['siguiente']
+
+    @classmethod
+    def cargar_o_construir(cls, grafo, huella, ruta_tabla):
+        """Abre la tabla; la recalcula si falta o no coincide con ``huella``"""
+        return cargar_o_construir(ruta_tabla, cls,
+                                  lambda tabla: tabla.huella == huella and tabla.n == grafo.n,
+                                  lambda ruta: guardar_tabla(ruta, huella, *floyd_warshall(grafo)))
+
+    def reparar(self, grafo, i, j, anterior, nuevo):
+        """Actualiza la tabla tras cambiar el peso de ``i -> j`` de ``anterior`` a ``nuevo``.
+
+        ``grafo`` ya tiene el peso nuevo. Si la arista se abarata, se relajan
+        solo los pares que mejoran pasando por ella; si se encarece o se
+        cierra, se recalculan con Dijkstra solo los orígenes con algún camino
+        mínimo que la usaba. Los cambios quedan en memoria: el archivo sigue
+        siendo el de ``conexiones.json``. Devuelve cuántos orígenes cambiaron.
+        """
+        if not self.dist.flags.writeable:
+            self.dist = np.array(self.dist)
+            self.siguiente = np.array(self.siguiente)
+        if nuevo < anterior:
+            via = self.dist[:, i, None] + nuevo + self.dist[None, j, :]
+            mejora = via < self.dist
+            # Los que mejoran van primero hacia i (j si ya están en i)
+            salto = self.siguiente[:, i].copy()
+            salto[i] = j
+            np.copyto(self.dist, via, where=mejora)
+            np.copyto(self.siguiente, np.broadcast_to(salto[:, None], self.siguiente.shape), where=mejora)
+            return int(mejora.any(axis=1).sum())
+        if nuevo > anterior:
+            with np.errstate(invalid='ignore'):
+                via = self.dist[:, i, None] + anterior + self.dist[None, j, :]
+                # Con tolerancia: sobra recalcular un origen, pero no puede faltar ninguno
+                usaba = np.isfinite(self.dist) & (via <= self.dist + 1e-9 * np.maximum(self.dist, 1.0))
+            origenes = np.flatnonzero(usaba.any(axis=1))
+            for origen in origenes:
+                self._recalcular_origen(grafo, int(origen))
+            return len(origenes)
+        return 0
+
+    def _recalcular_origen(self, grafo, origen):
+        """Fila de distancias y de siguiente salto de ``origen``, desde su árbol de Dijkstra"""
+        from motor_rutas import distancias_desde
+
+        dist, padres = distancias_desde(grafo, origen, con_padres=True)
+        salto = [-1] * self.n
+        salto[origen] = origen
+        for nodo in range(self.n):
+            if salto[nodo] != -1 or padres[nodo] == -1:
+                continue
+            # Se sube por el árbol hasta un nodo con salto conocido
+            cadena = []
+            while salto[nodo] == -1:
+                cadena.append(nodo)
+                nodo = padres[nodo]
+            primero = cadena[-1] if nodo == origen else salto[nodo]
+            for hijo in cadena:
+                salto[hijo] = primero
+        self.dist[origen] = dist
+        self.siguiente[origen] = salto
+
+    def distancia(self, i, j):
+        return float(self.dist[i, j])
+
+    def camino(self, i, j):
+        """Ids del camino mínimo de ``i`` a ``j`` siguiendo la matriz de siguiente salto"""
+        if self.siguiente[i, j] < 0:
+            return None
+        camino = [i]
+        while i != j:
+            i = int(self.siguiente[i, j])
+            camino.append(i)
+        return camino
+
+if __name__ == '__main__':
+    from motor_rutas import MotorRutas
+
+    ruta_json = sys.argv[1] if len(sys.argv) > 1 else 'conexiones.json'
+    motor = MotorRutas(ruta_json)
+    tabla = motor.cargar_tabla()
+    print(f"Tabla lista: '{tabla.ruta_tabla}' ({tabla.n} ciudades)")
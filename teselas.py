@@ -0,0 +1,241 @@
+"""Almacén local de teselas (SQLite con esquema MBTiles) y servidor HTTP local.
+
+Permite renderizar el mapa sin acceso a internet: primero se descargan las
+teselas de Colombia a un archivo ``.mbtiles`` y luego la aplicación apunta
+folium a ``ServidorTeselas.url_plantilla`` (o a una carpeta exportada con
+``file://``). Para pruebas, ``generar_sinteticas`` crea un juego de teselas
+de color liso sin tocar la red.
+
+Uso::
+
+    python teselas.py descargar [--salida teselas.mbtiles] [--zoom 4-8]
+    python teselas.py sinteticas [--salida teselas.mbtiles] [--zoom 4-8]
+    python teselas.py exportar --salida carpeta_teselas [--origen teselas.mbtiles]
+    python teselas.py servir [--origen teselas.mbtiles] [--puerto 8765]
+"""
+import argparse
+import math
+import os
+import pathlib
+import sqlite3
+import struct
+import threading
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites de _ajustar_vista_colombia ampliados a los máximos de la vista de rutas
+LIMITES_TESELAS = [[-4.5, -82.0], [13.0, -66.0]]
+# Niveles que usan la vista completa (~6) y las vistas de ruta (hasta ~8)
+ZOOMS_POR_DEFECTO = range(4, 9)
+URL_OSM = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'
+ATRIBUCION = '&copy; OpenStreetMap contributors'
+RUTA_POR_DEFECTO = 'teselas.mbtiles'
+
+def _tesela(lat, lon, zoom):
+    """Índices (x, y) de la tesela XYZ que contiene el punto"""
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def rango_teselas(limites, zoom):
+    """Todas las teselas (z, x, y) que cubren ``limites`` en un nivel de zoom"""
+    (sur, oeste), (norte, este) = limites
+    x0, y0 = _tesela(norte, oeste, zoom)
+    x1, y1 = _tesela(sur, este, zoom)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield zoom, x, y
+
+class AlmacenTeselas:
+    """Archivo MBTiles: tabla ``tiles`` con filas en convención TMS"""
+
+    def __init__(self, ruta=RUTA_POR_DEFECTO, solo_lectura=False):
+        """Abre (o crea) el archivo; con ``solo_lectura`` uno inexistente o sin tabla de teselas es un ``sqlite3.Error``"""
+        self.ruta = ruta
+        self._bloqueo = threading.Lock()
+        # El servidor lee desde varios hilos; cada consulta abre su propio cursor
+        if solo_lectura:
+            # ``mode=ro`` no crea el archivo: sin esto una ruta errada da un almacén vacío
+            uri = pathlib.Path(ruta).resolve().as_uri() + '?mode=ro'
+            self._conexion = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._conexion.execute('SELECT 1 FROM tiles LIMIT 1')
+            return
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        with self._conexion:
+            self._conexion.execute('CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)')
+            self._conexion.execute(
+                'CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, '
+                'tile_row INTEGER, tile_data BLOB, PRIMARY KEY (zoom_level, tile_column, tile_row))'
+            )
+
+    @staticmethod
+    def _fila_tms(z, y):
+        return 2 ** z - 1 - y
+
+    def obtener(self, z, x, y):
+        with self._bloqueo:
+            fila = self._conexion.execute(
+                'SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?',
+                (z, x, self._fila_tms(z, y))
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def contiene(self, z, x, y):
+        return self.obtener(z, x, y) is not None
+
+    def guardar(self, z, x, y, datos):
+        with self._bloqueo, self._conexion:
+            self._conexion.execute(
+                'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)',
+                (z, x, self._fila_tms(z, y), sqlite3.Binary(datos))
+            )
+
+    def guardar_metadatos(self, **metadatos):
+        with self._bloqueo, self._conexion:
+            self._conexion.executemany(
+                'INSERT OR REPLACE INTO metadata VALUES (?, ?)',
+                [(clave, str(valor)) for clave, valor in metadatos.items()]
+            )
+
+    def teselas(self):
+        """Itera (z, x, y, datos) en convención XYZ"""
+        with self._bloqueo:
+            filas = self._conexion.execute('SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles').fetchall()
+        for z, x, fila, datos in filas:
+            yield z, x, self._fila_tms(z, fila), datos
+
+    def cerrar(self):
+        self._conexion.close()
+
+def descargar(almacen, limites=LIMITES_TESELAS, zooms=ZOOMS_POR_DEFECTO, url=URL_OSM, timeout=10):
+    """Descarga las teselas que falten en ``almacen``; devuelve cuántas se bajaron"""
+    nuevas = 0
+    for zoom in zooms:
+        for z, x, y in rango_teselas(limites, zoom):
+            if almacen.contiene(z, x, y):
+                continue
+            peticion = urllib.request.Request(
+                url.format(z=z, x=x, y=y),
+                headers={'User-Agent': 'Proyecto-rutas-por-Colombia/1.0 (prefetch offline)'}
+            )
+            with urllib.request.urlopen(peticion, timeout=timeout) as respuesta:
+                almacen.guardar(z, x, y, respuesta.read())
+            nuevas += 1
+    almacen.guardar_metadatos(name='Colombia', format='png', minzoom=min(zooms), maxzoom=max(zooms),
+                              bounds=f"{limites[0][1]},{limites[0][0]},{limites[1][1]},{limites[1][0]}")
+    return nuevas
+
+def png_liso(color, tamano=256):
+    """PNG RGB de un solo color, generado solo con la biblioteca estándar"""
+    def bloque(tipo, datos):
+        return struct.pack('>I', len(datos)) + tipo + datos + struct.pack('>I', zlib.crc32(tipo + datos))
+
+    fila = b'\x00' + bytes(color) * tamano
+    return (b'\x89PNG\r\n\x1a\n'
+            + bloque(b'IHDR', struct.pack('>IIBBBBB', tamano, tamano, 8, 2, 0, 0, 0))
+            + bloque(b'IDAT', zlib.compress(fila * tamano))
+            + bloque(b'IEND', b''))
+
+def generar_sinteticas(almacen, limites=LIMITES_TESELAS, zooms=ZOOMS_POR_DEFECTO):
+    """Llena ``almacen`` con teselas lisas en damero, útil para pruebas sin red"""
+    claro, oscuro = png_liso((236, 240, 241)), png_liso((214, 219, 223))
+    total = 0
+    for zoom in zooms:
+        for z, x, y in rango_teselas(limites, zoom):
+            almacen.guardar(z, x, y, claro if (x + y) % 2 == 0 else oscuro)
+            total += 1
+    almacen.guardar_metadatos(name='Sintéticas', format='png', minzoom=min(zooms), maxzoom=max(zooms))
+    return total
+
+def exportar_directorio(almacen, carpeta):
+    """Escribe ``carpeta/z/x/y.png`` y devuelve la plantilla ``file://`` para folium"""
+    for z, x, y, datos in almacen.teselas():
+        destino = os.path.join(carpeta, str(z), str(x))
+        os.makedirs(destino, exist_ok=True)
+        with open(os.path.join(destino, f'{y}.png'), 'wb') as f:
+            f.write(datos)
+    return 'file:///' + os.path.abspath(carpeta).replace(os.sep, '/').lstrip('/') + '/{z}/{x}/{y}.png'
+
+class _ManejadorTeselas(BaseHTTPRequestHandler):
+    almacen = None
+
+    def do_GET(self):
+        partes = self.path.split('?')[0].strip('/').split('/')
+        try:
+            z, x, y = int(partes[0]), int(partes[1]), int(partes[2].split('.')[0])
+            datos = self.almacen.obtener(z, x, y)
+        except (IndexError, ValueError):
+            datos = None
+        if datos is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(datos)))
+        self.send_header('Cache-Control', 'max-age=86400')
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, formato, *args):
+        pass
+
+class ServidorTeselas:
+    """Servidor HTTP local en un hilo daemon que sirve ``/{z}/{x}/{y}.png``"""
+
+    def __init__(self, almacen, host='127.0.0.1', puerto=0):
+        manejador = type('Manejador', (_ManejadorTeselas,), {'almacen': almacen})
+        self.servidor = ThreadingHTTPServer((host, puerto), manejador)
+        self.servidor.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url_plantilla(self):
+        host, puerto = self.servidor.server_address[:2]
+        return f'http://{host}:{puerto}/{{z}}/{{x}}/{{y}}.png'
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+def _zooms(texto):
+    inicio, _, fin = texto.partition('-')
+    return range(int(inicio), int(fin or inicio) + 1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Teselas offline para el mapa de rutas")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    for nombre in ('descargar', 'sinteticas'):
+        p = sub.add_parser(nombre)
+        p.add_argument('--salida', default=RUTA_POR_DEFECTO)
+        p.add_argument('--zoom', type=_zooms, default=ZOOMS_POR_DEFECTO)
+    p = sub.add_parser('exportar')
+    p.add_argument('--origen', default=RUTA_POR_DEFECTO)
+    p.add_argument('--salida', required=True)
+    p = sub.add_parser('servir')
+    p.add_argument('--origen', default=RUTA_POR_DEFECTO)
+    p.add_argument('--puerto', type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.comando == 'descargar':
+        almacen = AlmacenTeselas(args.salida)
+        print(f"Teselas descargadas: {descargar(almacen, zooms=args.zoom)} en '{args.salida}'")
+    elif args.comando == 'sinteticas':
+        almacen = AlmacenTeselas(args.salida)
+        print(f"Teselas sintéticas: {generar_sinteticas(almacen, zooms=args.zoom)} en '{args.salida}'")
+    elif args.comando == 'exportar':
+        print(f"Plantilla para folium: {exportar_directorio(AlmacenTeselas(args.origen, solo_lectura=True), args.salida)}")
+    else:
+        servidor = ServidorTeselas(AlmacenTeselas(args.origen, solo_lectura=True), puerto=args.puerto)
+        print(f"Sirviendo teselas en {servidor.url_plantilla} (Ctrl+C para salir)")
+        try:
+            servidor.servidor.serve_forever()
+        except KeyboardInterrupt:
+            servidor.detener()
@@ -0,0 +1,68 @@
+"""Hilo de renderizado con una sola ranura: la última solicitud gana.
+
+El hilo de Tk nunca espera a un render. Las solicitudes que llegan mientras
+hay otra en cola la reemplazan, y los resultados que ya no corresponden a la
+última solicitud se descartan. Los resultados vuelven al hilo de Tk mediante
+``after``, porque los widgets solo pueden tocarse desde ese hilo.
+"""
+import queue
+import threading
+import traceback
+
+class TrabajadorRender:
+    def __init__(self, widget, intervalo_ms=30):
+        self.widget = widget
+        self.intervalo_ms = intervalo_ms
+        self._condicion = threading.Condition()
+        self._ranura = None
+        self._ultimo = 0
+        self._resultados = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, name='render', daemon=True)
+        self._hilo.start()
+        self.widget.after(self.intervalo_ms, self._revisar)
+
+    def solicitar(self, funcion, *args, al_terminar=None, al_fallar=None):
+        """Encola ``funcion(*args)`` reemplazando cualquier solicitud pendiente"""
+        with self._condicion:
+            self._ultimo += 1
+            self._ranura = (self._ultimo, funcion, args, al_terminar, al_fallar)
+            self._condicion.notify()
+            return self._ultimo
+
+    def cancelar(self):
+        """Descarta la solicitud pendiente y el resultado de la que esté en curso"""
+        with self._condicion:
+            self._ultimo += 1
+            self._ranura = None
+
+    def _vigente(self, ticket):
+        with self._condicion:
+            return ticket == self._ultimo
+
+    def _bucle(self):
+        while True:
+            with self._condicion:
+                while self._ranura is None:
+                    self._condicion.wait()
+                ticket, funcion, args, al_terminar, al_fallar = self._ranura
+                self._ranura = None
+            try:
+                resultado = funcion(*args)
+            except Exception as error:
+                traceback.print_exc()
+                self._resultados.put((ticket, al_fallar, error))
+                continue
+            # Si llegó otra solicitud mientras tanto, nadie verá este render
+            if self._vigente(ticket):
+                self._resultados.put((ticket, al_terminar, resultado))
+
+    def _revisar(self):
+        """Entrega en el hilo de Tk los resultados que siguen vigentes"""
+        try:
+            while True:
+                ticket, callback, valor = self._resultados.get_nowait()
+                if callback is not None and self._vigente(ticket):
+                    callback(valor)
+        except queue.Empty:
+            pass
+        self.widget.after(self.intervalo_ms, self._revisar)